@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Decoding of a large getEntities reply: suds vs. proteus.api.fastxml
+
+Both paths start from the same raw reply and end with a list of
+HostRecord objects. Every path runs in its own process and reports CPU
+time, peak RSS growth and the number of objects allocated.
+
+Usage: python benchmarks/decode.py [entities]
+"""
+
+import gc
+import sys
+import time
+import resource
+import multiprocessing
+
+from suds.client import Client, SoapClient
+
+from fakeserver import WSDL_PATH, _entity_xml, _response
+
+from proteus.objects import APIObject
+from proteus.api.fastxml import decode_entity_array
+
+
+def build_reply(count):
+    items = []
+    for i in range(count):
+        items.append(_entity_xml(
+            (i + 100, 'host%d' % i, 'HostRecord',
+             'absoluteName=host%d.example.com|addresses=10.%d.%d.%d|'
+             'reverseRecord=true|ttl=3600|' % (
+                 i, (i >> 16) & 255, (i >> 8) & 255, i & 255)),
+            'item'))
+    return _response('getEntities', '<return>%s</return>' % ''.join(items))
+
+
+def decode_suds(client, reply):
+    # what suds does with the reply of client.service.getEntities(...)
+    method = client.service.getEntities.method
+    result = SoapClient(client, method).process_reply(reply)
+    return [APIObject(TypeRecord=item) for item in result.item]
+
+
+def decode_fast(client, reply):
+    result = decode_entity_array(reply)
+    return [APIObject(TypeRecord=item) for item in result.item]
+
+
+def _cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _run(decode, count, queue):
+    try:
+        queue.put(_measure(decode, count))
+    except Exception, e:
+        queue.put(dict(error=repr(e)))
+
+
+def _measure(decode, count):
+    client = Client('file://%s' % WSDL_PATH)
+    reply = build_reply(count)
+    gc.collect()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    gc.disable()
+    objects = len(gc.get_objects())
+    cpu = _cpu()
+    started = time.time()
+    records = decode(client, reply)
+    elapsed = time.time() - started
+    cpu = _cpu() - cpu
+    objects = len(gc.get_objects()) - objects
+    gc.enable()
+    return dict(
+        records=len(records),
+        elapsed=elapsed,
+        cpu=cpu,
+        objects=objects,
+        rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss)
+
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    print '%d entities, %d bytes' % (count, len(build_reply(count)))
+    print '%-8s %8s %8s %8s %12s %12s' % (
+        'path', 'records', 'wall s', 'cpu s', 'gc objects', 'peak +MB')
+    for name, decode in (('suds', decode_suds), ('fastxml', decode_fast)):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_run, args=(decode, count, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if 'error' in result:
+            print '%-8s failed: %s' % (name, result['error'])
+            continue
+        print '%-8s %8d %8.2f %8.2f %12d %12.1f' % (
+            name, result['records'], result['elapsed'], result['cpu'],
+            result['objects'], result['rss'] / 1024.0)
+
+
+if __name__ == '__main__':
+    main()
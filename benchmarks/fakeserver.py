@@ -0,0 +1,413 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Stand-in Proteus SOAP server
+
+Serves benchmarks/API.wsdl and implements login, logout, getSystemInfo,
+getEntityByName and getEntities on a generated dataset, with an optional
+latency added to every call and a counter of the calls per operation,
+which is also available as JSON from /stats. Replies are gzip compressed
+when the server is created with compress and the client accepts it, gzip
+compressed requests are always understood.
+
+Usage: python benchmarks/fakeserver.py [port] [records per zone] [latency ms]
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import uuid
+import zlib
+import threading
+import BaseHTTPServer
+import SocketServer
+
+from cStringIO import StringIO
+from xml.etree import cElementTree as ElementTree
+from xml.sax.saxutils import escape
+
+
+WSDL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'API.wsdl')
+API_NAMESPACE = 'http://api.proteus.bluecatnetworks.com'
+SOAP_NAMESPACE = 'http://schemas.xmlsoap.org/soap/envelope/'
+
+
+class Dataset(object):
+    """
+    Generated Proteus data
+
+    One configuration with one view. Every zone in `zones` is created with
+    all its parent zones and gets `subzones` child zones, every leaf zone
+    holds `records` HostRecords plus a few MX, TXT and Alias records. Two
+    levels of IP4Blocks cover the host addresses.
+    """
+    def __init__(self, zones=('example.com', ), subzones=2, records=1000,
+                 config_name='default', view_name='Internal'):
+        self.config_name = config_name
+        self.view_name = view_name
+        self._next_id = 0
+        self.entities = {}
+        self.children = {}
+        self.by_name = {}
+        self.by_absolute_name = {}
+        self.config_id = self.add(0, config_name, 'Configuration', '')
+        self.view_id = self.add(self.config_id, view_name, 'View', '')
+        self.leaf_zones = []
+        for zonename in zones:
+            parent = self.view_id
+            labels = zonename.split('.')
+            for i in reversed(range(len(labels))):
+                parent = self.zone(parent, labels[i], '.'.join(labels[i:]))
+            self.leaf_zones.append((parent, zonename))
+            for j in range(subzones):
+                name = 'sub%d' % j
+                self.leaf_zones.append(
+                    (self.zone(parent, name, '%s.%s' % (name, zonename)),
+                     '%s.%s' % (name, zonename)))
+        block = self.add(self.config_id, '10.0.0.0/8', 'IP4Block',
+                         'CIDR=10.0.0.0/8|')
+        for z, (zone_id, zonename) in enumerate(self.leaf_zones):
+            self.add(block, '10.%d.0.0/16' % z, 'IP4Block',
+                     'CIDR=10.%d.0.0/16|' % z)
+            for i in range(records):
+                address = '10.%d.%d.%d' % (z, (i >> 8) & 255, i & 255)
+                self.add(zone_id, 'host%d' % i, 'HostRecord',
+                         'absoluteName=host%d.%s|addresses=%s|'
+                         'reverseRecord=true|ttl=3600|'
+                         % (i, zonename, address))
+            for i in range(max(records // 100, 1)):
+                self.add(zone_id, 'host%d' % i, 'MXRecord',
+                         'absoluteName=host%d.%s|priority=10|'
+                         'linkedRecordName=mx.%s|' % (i, zonename, zonename))
+                self.add(zone_id, 'host%d' % i, 'TXTRecord',
+                         'absoluteName=host%d.%s|txt=v=spf1 -all|'
+                         % (i, zonename))
+                self.add(zone_id, 'alias%d' % i, 'AliasRecord',
+                         'absoluteName=alias%d.%s|linkedRecordName=host%d.%s|'
+                         % (i, zonename, i, zonename))
+
+    def zone(self, parent, name, absolute_name):
+        existing = self.by_name.get((parent, name.lower(), 'Zone'))
+        if existing is not None:
+            return existing
+        return self.add(parent, name, 'Zone',
+                        'absoluteName=%s|deployable=true|' % absolute_name)
+
+    def add(self, parent, name, entity_type, properties):
+        self._next_id += 1
+        entity_id = self._next_id
+        self.entities[entity_id] = (entity_id, name, entity_type, properties)
+        self.children.setdefault((parent, entity_type), []).append(entity_id)
+        self.by_name.setdefault((parent, name.lower(), entity_type), entity_id)
+        for prop in properties.split('|'):
+            key, sep, value = prop.partition('=')
+            if key == 'absoluteName':
+                self.by_absolute_name.setdefault(
+                    (value.lower(), entity_type), []).append(entity_id)
+        return entity_id
+
+
+def _entity_xml(entity, tag):
+    if entity is None:
+        return '<%s><id>0</id></%s>' % (tag, tag)
+    return '<%s><id>%d</id><name>%s</name><type>%s</type>' \
+        '<properties>%s</properties></%s>' % (
+            tag, entity[0], escape(entity[1]), entity[2], escape(entity[3]),
+            tag)
+
+
+def _envelope(body):
+    return '<?xml version="1.0" encoding="UTF-8"?>' \
+        '<soap:Envelope xmlns:soap="%s"><soap:Body>%s</soap:Body>' \
+        '</soap:Envelope>' % (SOAP_NAMESPACE, body)
+
+
+def _response(operation, content):
+    return _envelope('<ns:%sResponse xmlns:ns="%s">%s</ns:%sResponse>' % (
+        operation, API_NAMESPACE, content, operation))
+
+
+class SOAPFault(Exception):
+    pass
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.proteus.count_connection()
+
+    def _send(self, code, body, content_type='text/xml; charset=utf-8',
+              headers=None):
+        accepted = self.headers.get('Accept-Encoding', '')
+        if self.server.proteus.compress and 'gzip' in accepted:
+            buf = StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6)
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+            headers = dict(headers or {})
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(200, json.dumps(self.server.proteus.stats()),
+                       'application/json')
+            return
+        if not self.path.startswith('/Services/API'):
+            self._send(404, 'Not found', 'text/plain')
+            return
+        self._send(200, self.server.proteus.wsdl())
+
+    def _session(self):
+        cookie = self.headers.get('Cookie', '')
+        for part in cookie.split(';'):
+            name, sep, value = part.strip().partition('=')
+            if name == 'JSESSIONID':
+                return value
+        return None
+
+    def do_POST(self):
+        proteus = self.server.proteus
+        length = int(self.headers.get('Content-Length', 0))
+        request = self.rfile.read(length)
+        if self.headers.get('Content-Encoding', '') == 'gzip':
+            request = zlib.decompress(request, 16 + zlib.MAX_WBITS)
+        if proteus.latency:
+            time.sleep(proteus.latency)
+        headers = {}
+        try:
+            body = ElementTree.fromstring(request).find(
+                '{%s}Body' % SOAP_NAMESPACE)
+            call = body[0]
+            operation = call.tag.rpartition('}')[2]
+            arguments = dict(
+                (child.tag.rpartition('}')[2], child.text) for child in call)
+            proteus.count(operation, len(request))
+            if operation == 'login':
+                session = proteus.login(
+                    arguments.get('username'), arguments.get('password'))
+                headers['Set-Cookie'] = 'JSESSIONID=%s; Path=/' % session
+                content = ''
+            else:
+                session = self._session()
+                if not proteus.is_session(session):
+                    raise SOAPFault('Not logged in')
+                content = proteus.call(session, operation, arguments)
+            proteus.count_sent(self._send(
+                200, _response(operation, content), headers=headers))
+        except SOAPFault, e:
+            self._send(500, _envelope(
+                '<soap:Fault><faultcode>soap:Server</faultcode>'
+                '<faultstring>%s</faultstring></soap:Fault>'
+                % escape(str(e))))
+
+
+class _HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeProteusServer(object):
+    """
+    Threaded stand-in for the Proteus SOAP API
+
+    Example:
+        >>> server=FakeProteusServer(Dataset(records=5000), latency=0.005)
+        >>> server.start()
+        >>> pc=ProteusClient(server.url, 'user', 'password', 'default')
+        >>> ...
+        >>> server.calls
+        >>> server.stop()
+    """
+    def __init__(self, dataset=None, latency=0.0, host='127.0.0.1', port=0,
+                 username=None, password=None, compress=False, search=True):
+        """
+        :Parameters:
+            - `dataset` : :py:class:`Dataset`
+            - `latency` : float [ seconds added to every SOAP call ]
+            - `host` : string
+            - `port` : int [ 0 picks a free port ]
+            - `username` : string [ optional, accepted login ]
+            - `password` : string [ optional, accepted login ]
+            - `compress` : bool [ gzip replies for clients accepting it ]
+            - `search` : bool [ support getHostRecordsByHint and searchByObjectTypes ]
+        """
+        if dataset is None:
+            dataset = Dataset()
+        self.dataset = dataset
+        self.latency = latency
+        self.compress = compress
+        self.search = search
+        self._username = username
+        self._password = password
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.connections = 0
+        self._server = _HTTPServer((host, port), _Handler)
+        self._server.proteus = self
+        self._thread = None
+        f = open(WSDL_PATH, 'rb')
+        try:
+            self._wsdl = f.read().replace(
+                'http://localhost/Services/API', '%sServices/API' % self.url)
+        finally:
+            f.close()
+
+    def _get_url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d/' % (host, port)
+    url = property(_get_url, doc='API URL of the server')
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wsdl(self):
+        return self._wsdl
+
+    def count(self, operation, size):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            self.bytes_received += size
+
+    def count_sent(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls = {}
+            self.bytes_received = 0
+            self.bytes_sent = 0
+            self.connections = 0
+
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def stats(self):
+        with self._lock:
+            return dict(calls=dict(self.calls),
+                        round_trips=sum(self.calls.values()),
+                        bytes_received=self.bytes_received,
+                        bytes_sent=self.bytes_sent,
+                        connections=self.connections)
+
+    def login(self, username, password):
+        if self._username is not None and (
+                username != self._username or password != self._password):
+            raise SOAPFault('Invalid username or password')
+        session = uuid.uuid4().hex
+        with self._lock:
+            self._sessions.add(session)
+        return session
+
+    def is_session(self, session):
+        return session in self._sessions
+
+    def call(self, session, operation, arguments):
+        data = self.dataset
+        if operation == 'logout':
+            with self._lock:
+                self._sessions.discard(session)
+            return ''
+        if operation == 'getSystemInfo':
+            return '<return>version=fake|</return>'
+        if operation == 'getEntityByName':
+            entity_id = data.by_name.get((
+                int(arguments['parentId']),
+                (arguments.get('name') or '').lower(),
+                arguments.get('type')))
+            return _entity_xml(data.entities.get(entity_id), 'return')
+        if operation == 'getEntities':
+            start = int(arguments['start'])
+            count = int(arguments['count'])
+            ids = data.children.get(
+                (int(arguments['parentId']), arguments.get('type')), [])
+            items = [_entity_xml(data.entities[i], 'item')
+                     for i in ids[start:start + count]]
+            return '<return>%s</return>' % ''.join(items)
+        if operation == 'getHostRecordsByHint' and self.search:
+            # only exact '^name$' hints are supported
+            options = dict(o.partition('=')[::2]
+                           for o in (arguments.get('options') or '').split('|'))
+            hint = options.get('hint', '').strip('^$').lower()
+            return self._search_result(
+                data.by_absolute_name.get((hint, 'HostRecord'), []),
+                arguments)
+        if operation == 'searchByObjectTypes' and self.search:
+            keyword = (arguments.get('keyword') or '').strip('^$').lower()
+            types = (arguments.get('types') or '').split(',')
+            ids = sorted(i for i in data.entities
+                         if data.entities[i][1].lower() == keyword
+                         and data.entities[i][2] in types)
+            return self._search_result(ids, arguments)
+        raise SOAPFault('Unknown operation %s' % operation)
+
+    def _search_result(self, ids, arguments):
+        start = int(arguments['start'])
+        count = int(arguments['count'])
+        items = [_entity_xml(self.dataset.entities[i], 'item')
+                 for i in ids[start:start + count]]
+        return '<return>%s</return>' % ''.join(items)
+
+
+if __name__ == '__main__':
+    port = 8080
+    records = 1000
+    latency = 0.0
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        records = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        latency = float(sys.argv[3]) / 1000.0
+    server = FakeProteusServer(Dataset(records=records), latency, port=port)
+    print 'Serving fake Proteus API on %s' % server.url
+    server._server.serve_forever()
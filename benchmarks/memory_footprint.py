@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Memory footprint of decoded records
+
+Builds HostRecords from synthetic suds APIEntity objects and reports the
+retained bytes per record, once for the record classes of this library
+and once for the previous layout, which kept the suds object, its asdict()
+dictionary and a property object with its own __dict__. The previous
+layout parsed the properties right away, the record classes parse them on
+first access, so they are measured before and after reading a property of
+every record.
+
+Usage: python benchmarks/memory_footprint.py [number of records]
+"""
+
+import gc
+import sys
+import types
+
+from suds.sax.text import Text
+from suds.sudsobject import Factory, asdict
+
+from proteus.objects import APIObject
+
+
+class LegacyPropertyObject(object):
+    def __init__(self, properties):
+        self._property_string = properties
+        property_list = properties[:-1].split('|')
+        self.__dict__['_property_list'] = []
+        for i in property_list:
+            arr = iter(i.split('='))
+            self.__dict__['_property_list'].append(i.split('=')[0])
+            self.__dict__.update(dict(zip(arr, arr)))
+
+
+class LegacyRecord(object):
+    def __init__(self, entity):
+        self._raw_entity = entity
+        self._raw_data = asdict(entity)
+        self._client = None
+        self._raw_data['properties'] = LegacyPropertyObject(
+            self._raw_data['properties'])
+
+
+def make_entity(i):
+    return Factory.object('APIEntity', dict(
+        id=long(100000 + i),
+        name=Text('host%d' % i),
+        type=Text('HostRecord'),
+        properties=Text(
+            'absoluteName=host%d.rack%d.example.com|'
+            'addresses=10.%d.%d.%d|reverseRecord=true|ttl=3600|'
+            % (i, i // 40, (i >> 16) & 255, (i >> 8) & 255, i & 255))))
+
+
+def retained_size(objects):
+    """
+    Sum of sys.getsizeof over everything reachable from objects,
+    classes, modules and functions are shared and not counted
+    """
+    seen = set()
+    stack = list(objects)
+    total = 0
+    skip = (type, types.ModuleType, types.FunctionType,
+            types.BuiltinFunctionType, types.ClassType)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, skip):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return total
+
+
+def main(count):
+    entities = [make_entity(i) for i in range(count)]
+    legacy = [LegacyRecord(e) for e in entities]
+    legacy_size = retained_size([legacy])
+    del legacy
+    records = [APIObject(TypeRecord=e) for e in entities]
+    del entities
+    gc.collect()
+    records[0].properties.addresses
+    size = retained_size([records])
+    for record in records:
+        record.properties.addresses
+    parsed_size = retained_size([records])
+    print 'records:                 %d' % count
+    print 'previous layout:         %d bytes/record' % (legacy_size // count)
+    print 'slotted records:         %d bytes/record' % (size // count)
+    print 'reduction:               %.1f%%' % (
+        100.0 - 100.0 * size / legacy_size)
+    print 'properties parsed:       %d bytes/record' % (parsed_size // count)
+    print 'reduction:               %.1f%%' % (
+        100.0 - 100.0 * parsed_size / legacy_size)
+
+
+if __name__ == '__main__':
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    main(count)
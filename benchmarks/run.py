@@ -0,0 +1,298 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+End-to-end benchmarks against the stand-in Proteus server
+
+Every scenario runs in its own process, so the reported peak memory
+growth is the one of that scenario alone. Round trips, TCP connections and
+reply bytes are counted by the server.
+
+Usage: python benchmarks/run.py [options] [scenario ...]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import urllib2
+import resource
+import tempfile
+import optparse
+import multiprocessing
+
+from fakeserver import FakeProteusServer, Dataset
+
+from proteus.api import ProteusClient
+from proteus.api.cache import WSDLCache
+from proteus.api.transport import KeepAliveTransport
+
+
+ZONE = 'sub0.example.com'
+VIEW = 'Internal'
+
+
+def _stats(url):
+    return json.load(urllib2.urlopen('%sstats' % url))
+
+
+def _client(url, options, **kwargs):
+    if options.keepalive:
+        kwargs['transport'] = KeepAliveTransport()
+    client = ProteusClient(url, 'user', 'password', 'default', **kwargs)
+    if not client.login():
+        raise Exception('Login failed')
+    return client
+
+
+def scenario_login(url, options):
+    """login() with a WSDL download and parse every time"""
+    def _op():
+        _client(url, options).logout()
+    return _op, None
+
+
+def scenario_login_cached(url, options):
+    """login() with the on-disk WSDL cache"""
+    location = tempfile.mkdtemp()
+    cache = WSDLCache(location)
+    _client(url, options, wsdl_cache=cache).logout()
+
+    def _op():
+        _client(url, options, wsdl_cache=cache).logout()
+    return _op, lambda: shutil.rmtree(location, True)
+
+
+def scenario_host_lookup_cold(url, options):
+    """get_host_record() walking view and zones every time"""
+    client = _client(url, options)
+    dns = client.DNS
+    state = dict(i=0)
+
+    def _op():
+        dns.invalidate_zone_cache()
+        state['i'] = (state['i'] + 1) % options.records
+        dns.get_host_record('host%d' % state['i'], ZONE, view_name=VIEW)
+    return _op, client.logout
+
+
+def scenario_host_lookup_search(url, options):
+    """get_host_record() with server-side search, no zone walk"""
+    client = _client(url, options, server_search=True)
+    dns = client.DNS
+    state = dict(i=0)
+
+    def _op():
+        dns.invalidate_zone_cache()
+        state['i'] = (state['i'] + 1) % options.records
+        dns.get_host_record('host%d' % state['i'], ZONE, view_name=VIEW)
+    return _op, client.logout
+
+
+def scenario_host_lookup(url, options):
+    """get_host_record() with a warm zone path cache"""
+    client = _client(url, options)
+    dns = client.DNS
+    dns.get_host_record('host0', ZONE, view_name=VIEW)
+    state = dict(i=0)
+
+    def _op():
+        state['i'] = (state['i'] + 1) % options.records
+        dns.get_host_record('host%d' % state['i'], ZONE, view_name=VIEW)
+    return _op, client.logout
+
+
+def scenario_batch_lookup(url, options):
+    """get_records() for 100 hosts with 4 pooled sessions"""
+    client = _client(url, options, pool_size=4)
+    dns = client.DNS
+    items = [('host%d' % i, ZONE) for i in range(min(100, options.records))]
+
+    def _op():
+        dns.invalidate_zone_cache()
+        dns.get_records(items, view_name=VIEW, workers=4)
+    return _op, client.logout
+
+
+def scenario_zone_list(url, options):
+    """get_zone_list() of all types, sequential"""
+    client = _client(url, options)
+    dns = client.DNS
+
+    def _op():
+        dns.get_zone_list(ZONE, view_name=VIEW)
+    return _op, client.logout
+
+
+def scenario_zone_list_parallel(url, options):
+    """get_zone_list() of all types, 4 pooled sessions"""
+    client = _client(url, options, pool_size=4)
+    dns = client.DNS
+
+    def _op():
+        dns.get_zone_list(ZONE, view_name=VIEW, workers=4)
+    return _op, client.logout
+
+
+def scenario_zone_iter(url, options):
+    """iter_zone_records() of all HostRecords, records are dropped"""
+    client = _client(url, options)
+    dns = client.DNS
+    zone = dns._find_zone(ZONE, view_name=VIEW)
+
+    def _op():
+        for record in dns.iter_zone_records(zone, 'HostRecord'):
+            pass
+    return _op, client.logout
+
+
+def scenario_zone_page(url, options):
+    """iter_zone_records() of all HostRecords in one page, fast decode"""
+    client = _client(url, options, fast_decode=True)
+    dns = client.DNS
+    zone = dns._find_zone(ZONE, view_name=VIEW)
+
+    def _op():
+        for record in dns.iter_zone_records(
+                zone, 'HostRecord', options.records + 1):
+            pass
+    return _op, client.logout
+
+
+def scenario_zone_stream(url, options):
+    """iter_zone_records() of all HostRecords in one streamed page"""
+    client = _client(url, options)
+    dns = client.DNS
+    zone = dns._find_zone(ZONE, view_name=VIEW)
+
+    def _op():
+        for record in dns.iter_zone_records(
+                zone, 'HostRecord', options.records + 1, stream=True):
+            pass
+    return _op, client.logout
+
+
+SCENARIOS = [
+    ('login', scenario_login),
+    ('login_cached', scenario_login_cached),
+    ('host_lookup_cold', scenario_host_lookup_cold),
+    ('host_lookup_search', scenario_host_lookup_search),
+    ('host_lookup', scenario_host_lookup),
+    ('batch_lookup', scenario_batch_lookup),
+    ('zone_list', scenario_zone_list),
+    ('zone_list_parallel', scenario_zone_list_parallel),
+    ('zone_iter', scenario_zone_iter),
+    ('zone_page', scenario_zone_page),
+    ('zone_stream', scenario_zone_stream),
+]
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+
+def _run(scenario, url, options, queue):
+    # the child inherits the memory of the server process
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        op, teardown = scenario(url, options)
+        before = _stats(url)
+        latencies = []
+        started = time.time()
+        for i in range(options.iterations):
+            t = time.time()
+            op()
+            latencies.append(time.time() - t)
+        elapsed = time.time() - started
+        after = _stats(url)
+        if teardown is not None:
+            teardown()
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put(dict(
+            latencies=latencies,
+            elapsed=elapsed,
+            round_trips=after['round_trips'] - before['round_trips'],
+            # minus the connection of the second /stats request
+            connections=after['connections'] - before['connections'] - 1,
+            bytes_sent=after['bytes_sent'] - before['bytes_sent'],
+            peak_kb=peak - baseline))
+    except Exception, e:
+        queue.put(dict(error=repr(e)))
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage='%prog [options] [scenario ...]',
+        description='Scenarios: %s' % ', '.join(n for n, s in SCENARIOS))
+    parser.add_option('--records', type='int', default=2000,
+                      help='HostRecords per zone [%default]')
+    parser.add_option('--latency', type='float', default=2.0,
+                      help='server latency per call in ms [%default]')
+    parser.add_option('--iterations', type='int', default=20,
+                      help='iterations per scenario [%default]')
+    parser.add_option('--keepalive', action='store_true', default=False,
+                      help='use proteus.api.transport.KeepAliveTransport')
+    parser.add_option('--gzip', action='store_true', default=False,
+                      help='let the server compress replies')
+    options, names = parser.parse_args()
+    selected = [s for s in SCENARIOS if not names or s[0] in names]
+
+    server = FakeProteusServer(
+        Dataset(records=options.records), options.latency / 1000.0,
+        compress=options.gzip)
+    server.start()
+    print '%d records/zone, %.1fms latency, %d iterations%s%s' % (
+        options.records, options.latency, options.iterations,
+        options.keepalive and ', keep-alive' or '',
+        options.gzip and ', gzip' or '')
+    print '%-20s %9s %9s %9s %9s %9s %9s %10s %10s' % (
+        'scenario', 'p50 ms', 'p90 ms', 'p99 ms', 'ops/s', 'trips/op',
+        'conns/op', 'KB/op', 'peak +MB')
+    try:
+        for name, scenario in selected:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_run, args=(scenario, server.url, options, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            if 'error' in result:
+                print '%-20s failed: %s' % (name, result['error'])
+                continue
+            latencies = result['latencies']
+            print '%-20s %9.2f %9.2f %9.2f %9.1f %9.1f %9.1f %10.1f %10.1f' % (
+                name,
+                _percentile(latencies, 50) * 1000,
+                _percentile(latencies, 90) * 1000,
+                _percentile(latencies, 99) * 1000,
+                len(latencies) / result['elapsed'],
+                float(result['round_trips']) / len(latencies),
+                float(result['connections']) / len(latencies),
+                result['bytes_sent'] / 1024.0 / len(latencies),
+                result['peak_kb'] / 1024.0)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,14 @@
 #!/usr/bin/python
 
 
-from proteus import ProteusClient
+import sys
+
+from proteus.api import ProteusClient
 
 if __name__=='__main__':
+    # i.e. against benchmarks/fakeserver.py:
+    # test_proteus.py http://127.0.0.1:8080/ user password default
+    a=ProteusClient(*sys.argv[1:5])
     a.login()
     #b=a.get_txt_record('_kerberos.opsec-auth-test1.ops.expertcity.com',view_name='Internal')
     #b=a.get_hinfo_record('dc2-dc2db','ops.expertcity.com',view_name='Internal')
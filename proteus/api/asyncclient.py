@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+from constants import *
+from client import ProteusClient
+from concurrency import WorkerPool
+
+
+class AsyncProteusClient(object):
+    """
+    Non blocking Proteus Client
+
+    Every method returns immediately with a
+    :py:class:`proteus.api.concurrency.Future`. The calls are executed by a
+    pool of `concurrency` worker threads, each drawing its own session from
+    the session pool of the wrapped :py:class:`proteus.api.client.ProteusClient`,
+    so any number of lookups can be queued while at most `concurrency` SOAP
+    calls are in flight.
+    """
+    def __init__(
+        self,
+        api_url=None,
+        api_user=None,
+        api_password=None,
+        config_name=None,
+        concurrency=8,
+        wsdl_cache=None,
+        pool_options=None,
+        instruments=None,
+        fast_decode=False,
+        transport=None,
+        negative_cache_ttl=None,
+        lookup_cache=None,
+        server_search=False):
+        """
+        :Parameters:
+            - `api_url` : string
+            - `api_user` : string
+            - `api_password` : string
+            - `config_name` : string
+            - `concurrency` : int [ max. number of SOAP calls in flight ]
+            - `wsdl_cache` : :py:class:`proteus.api.cache.WSDLCache` [ optional ]
+            - `pool_options` : dict [ optional, keyword arguments for :py:class:`proteus.api.pool.SessionPool` ]
+            - `instruments` : list of :py:class:`proteus.api.instrumentation.Instrument` [ optional ]
+            - `fast_decode` : bool [ see :py:class:`proteus.api.client.ProteusClientApi` ]
+            - `transport` : suds Transport [ see :py:class:`proteus.api.client.ProteusClientApi` ]
+            - `negative_cache_ttl` : int [ see :py:class:`proteus.api.client.ProteusClientApi` ]
+            - `lookup_cache` : :py:class:`proteus.api.cache.SharedCache` [ see :py:class:`proteus.api.client.ProteusClientApi` ]
+            - `server_search` : bool [ see :py:class:`proteus.api.client.ProteusClient` ]
+
+        Example:
+            >>> from proteus.api.asyncclient import AsyncProteusClient
+            >>> pc=AsyncProteusClient(
+                'http://proteus.domain.tld/',
+                'username',
+                'password',
+                'proteus_configuration_object_name')
+            >>> pc.login().result()
+            >>> futures=[pc.get_host_record(h, 'domain.tld', view_name='Internal')
+                for h in hostnames]
+            >>> records=[f.result() for f in futures]
+        """
+        self._client = ProteusClient(
+            api_url,
+            api_user,
+            api_password,
+            config_name,
+            wsdl_cache,
+            concurrency,
+            pool_options,
+            instruments,
+            fast_decode,
+            transport,
+            negative_cache_ttl,
+            lookup_cache,
+            server_search)
+        self._executor = WorkerPool(concurrency)
+
+    def _submit(self, func, *args, **kwargs):
+        return self._executor.submit(func, *args, **kwargs)
+
+    def get_client(self):
+        return self._client
+    Client = property(get_client, doc='Wrapped blocking ProteusClient')
+
+    def login(self):
+        """
+        Connect and login, see :py:meth:`proteus.api.client.ProteusClientApi.login`
+        """
+        return self._submit(self._client.login)
+
+    def logout(self):
+        """
+        Logout and disconnect, see :py:meth:`proteus.api.client.ProteusClientApi.logout`
+        """
+        return self._submit(self._client.logout)
+
+    def close(self):
+        """
+        Stop the worker threads once all queued calls are done
+        """
+        self._executor.shutdown()
+
+    def _get_entity_by_name(self, parent_id, entity_name, entity_type):
+        """
+        See :py:meth:`proteus.api.client.ProteusClientApi._get_entity_by_name`
+        """
+        return self._submit(
+            self._client._get_entity_by_name,
+            parent_id,
+            entity_name,
+            entity_type)
+
+    def _get_entities(self, parent_id, entity_type, start=1, count=1):
+        """
+        See :py:meth:`proteus.api.client.ProteusClientApi._get_entities`
+        """
+        return self._submit(
+            self._client._get_entities,
+            parent_id,
+            entity_type,
+            start,
+            count)
+
+    def get_host_record(self, hostname, zonename, view=None, view_name=None):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_host_record`
+        """
+        return self._submit(
+            self._client.DNS.get_host_record,
+            hostname, zonename, view, view_name)
+
+    def get_mx_record(self, hostname, zonename, view=None, view_name=None):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_mx_record`
+        """
+        return self._submit(
+            self._client.DNS.get_mx_record,
+            hostname, zonename, view, view_name)
+
+    def get_txt_record(self, hostname, zonename, view=None, view_name=None):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_txt_record`
+        """
+        return self._submit(
+            self._client.DNS.get_txt_record,
+            hostname, zonename, view, view_name)
+
+    def get_cname_record(self, hostname, zonename, view=None, view_name=None):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_cname_record`
+        """
+        return self._submit(
+            self._client.DNS.get_cname_record,
+            hostname, zonename, view, view_name)
+
+    def get_hinfo_record(self, hostname, zonename, view=None, view_name=None):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_hinfo_record`
+        """
+        return self._submit(
+            self._client.DNS.get_hinfo_record,
+            hostname, zonename, view, view_name)
+
+    def get_srv_record(self, hostname, zonename, view=None, view_name=None):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_srv_record`
+        """
+        return self._submit(
+            self._client.DNS.get_srv_record,
+            hostname, zonename, view, view_name)
+
+    def get_zone_list(self, zonename, view=None, view_name=None,
+                      rec_type=DNS_ALLTYPES, page_size=DEFAULT_PAGE_SIZE):
+        """
+        See :py:meth:`proteus.api.dns.DNS.get_zone_list`
+        """
+        return self._submit(
+            self._client.DNS.get_zone_list,
+            zonename, view, view_name, rec_type, page_size)
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+import os
+import sys
+import stat
+import errno
+import json
+import random
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+
+from collections import OrderedDict
+
+try:
+    from suds.client import Client
+    from suds.cache import ObjectCache
+except ImportError, e:
+    print "You don't have the python suds library installed."
+    sys.exit(1)
+
+
+CACHE_VERSION = 1
+
+
+def _private_directory(name):
+    """
+    Per-user directory below the system temp directory
+
+    The cache files are trusted, the suds definitions are even unpickled,
+    so the directory must not be writable by other users. It is created
+    with mode 0700 and refused when it belongs to someone else or is
+    accessible by others.
+    """
+    if not hasattr(os, 'getuid'):
+        # i.e. Windows, where the temp directory is per user already
+        return os.path.join(tempfile.gettempdir(), name)
+    uid = os.getuid()
+    path = os.path.join(tempfile.gettempdir(), '%s-%d' % (name, uid))
+    try:
+        os.mkdir(path, 0700)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid \
+        or st.st_mode & 077:
+        raise Exception('Insecure cache directory %s' % path)
+    return path
+
+
+class WSDLCache(object):
+    """
+    On-disk cache for the Proteus SOAP service definition
+
+    The WSDL document is downloaded once per API URL and stored together
+    with its SHA1 hash. The parsed suds definition is pickled into a
+    directory named after that hash, so a changed WSDL is never served from
+    a stale parse. Everything lives below a versioned directory, bumping
+    :py:data:`CACHE_VERSION` invalidates all existing caches.
+    """
+    def __init__(self, location=None, wsdl_file=None):
+        """
+        :Parameters:
+            - `location` : string [ cache directory, defaults to a private directory of the user in the system temp directory ]
+            - `wsdl_file` : string [ path to a pre-built WSDL document, skips the download ]
+
+        Example:
+            >>> from proteus.api import ProteusClientApi
+            >>> from proteus.api.cache import WSDLCache
+            >>> pc=ProteusClientApi(
+                'http://proteus.domain.tld/',
+                'username',
+                'password',
+                wsdl_cache=WSDLCache('/var/cache/proteus'))
+        """
+        if location is None:
+            location = _private_directory('python-proteus')
+        self._location = os.path.join(location, 'v%d' % CACHE_VERSION)
+        self._wsdl_file = wsdl_file
+
+    def _key(self, api_url):
+        return hashlib.sha1(api_url).hexdigest()
+
+    def _path(self, api_url, suffix):
+        return os.path.join(self._location, self._key(api_url) + suffix)
+
+    def _definitions_location(self, digest):
+        return os.path.join(self._location, 'definitions', digest)
+
+    def _write(self, path, data):
+        if not os.path.isdir(self._location):
+            os.makedirs(self._location)
+        fd, tmp_path = tempfile.mkstemp(dir=self._location)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.rename(tmp_path, path)
+
+    def _fetch(self, api_url):
+        """
+        Download the WSDL document and store it with its hash
+        """
+        response = urllib2.urlopen('%sServices/API?wsdl' % api_url)
+        try:
+            wsdl = response.read()
+        finally:
+            response.close()
+        digest = hashlib.sha1(wsdl).hexdigest()
+        self._write(self._path(api_url, '.wsdl'), wsdl)
+        self._write(self._path(api_url, '.sha1'), digest)
+        return digest
+
+    def get_wsdl(self, api_url):
+        """
+        Get the local WSDL document for an API URL, downloading it if needed
+
+        :Parameters:
+            - `api_url` : string
+
+        :return:
+            tuple of ( path, sha1 hash )
+        """
+        if self._wsdl_file is not None:
+            path = os.path.abspath(self._wsdl_file)
+            f = open(path, 'rb')
+            try:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            finally:
+                f.close()
+            return path, digest
+        path = self._path(api_url, '.wsdl')
+        digest_path = self._path(api_url, '.sha1')
+        if os.path.exists(path) and os.path.exists(digest_path):
+            f = open(digest_path, 'rb')
+            try:
+                return path, f.read().strip()
+            finally:
+                f.close()
+        return path, self._fetch(api_url)
+
+    def get_client(self, api_url, **options):
+        """
+        Build a suds Client from the cached service definition
+
+        :Parameters:
+            - `api_url` : string
+            - `options` : additional suds Client options
+
+        :return:
+            `suds.client.Client`
+        """
+        path, digest = self.get_wsdl(api_url)
+        url = urlparse.urljoin('file:', urllib.pathname2url(path))
+        cache = ObjectCache(location=self._definitions_location(digest))
+        return Client(url, cache=cache, cachingpolicy=1, **options)
+
+    def invalidate(self, api_url=None):
+        """
+        Drop cached definitions
+
+        :Parameters:
+            - `api_url` : string [ None drops the whole cache ]
+        """
+        if api_url is None:
+            shutil.rmtree(self._location, True)
+            return
+        digest_path = self._path(api_url, '.sha1')
+        if os.path.exists(digest_path):
+            f = open(digest_path, 'rb')
+            try:
+                digest = f.read().strip()
+            finally:
+                f.close()
+            shutil.rmtree(self._definitions_location(digest), True)
+        for suffix in ('.wsdl', '.sha1'):
+            path = self._path(api_url, suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LRUCache(object):
+    """
+    Thread safe, size bounded key/value cache with optional expiry
+
+    The least recently used entry is dropped once `max_size` is exceeded,
+    entries older than `ttl` seconds are treated as missing.
+    """
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        :Parameters:
+            - `max_size` : int
+            - `ttl` : int [ seconds, None or 0 means entries never expire ]
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get a cached value, refreshing its position in the LRU order
+        """
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            self._data[key] = (expires, value)
+            return value
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if needed
+        """
+        expires = None
+        if self._ttl:
+            expires = time.time() + self._ttl
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self._max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Drop one entry, or everything when `key` is None
+        """
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def invalidate_matching(self, predicate):
+        """
+        Drop every entry whose key satisfies `predicate`
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache(object):
+    """
+    Key/value cache in a SQLite database, shared by all processes on a host
+
+    The database runs in WAL mode, so readers never block each other nor
+    the writer, and concurrent writers wait for each other up to `timeout`
+    seconds. Keys and values have to be JSON serializable, tuple keys come
+    back as tuples. Entries older than `ttl` seconds are treated as missing
+    and purged from time to time. It has the interface of
+    :py:class:`LRUCache`, every thread uses its own database connection.
+
+    Example:
+        >>> from proteus.api import ProteusClient
+        >>> from proteus.api.cache import SharedCache
+        >>> pc=ProteusClient(
+                'http://proteus.domain.tld/',
+                'username',
+                'password',
+                'configuration',
+                lookup_cache=SharedCache('/var/cache/proteus/lookup.db'))
+    """
+    PURGE_PROBABILITY = 0.001
+
+    def __init__(self, path=None, ttl=300, timeout=10.0):
+        """
+        :Parameters:
+            - `path` : string [ database file, defaults to a private directory of the user in the system temp directory ]
+            - `ttl` : int [ seconds, None or 0 means entries never expire ]
+            - `timeout` : float [ seconds to wait for a locked database ]
+        """
+        if path is None:
+            path = os.path.join(
+                _private_directory('python-proteus'),
+                'lookup-v%d.db' % CACHE_VERSION)
+        self._path = path
+        self._ttl = ttl
+        self._timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created by another process in the meantime
+                if not os.path.isdir(directory):
+                    raise
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, expires REAL, value TEXT)')
+
+    def _connection(self):
+        """
+        The connection of the current thread, connections are never shared
+        with forked child processes
+        """
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            connection = sqlite3.connect(self._path, timeout=self._timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            local.connection = connection
+            local.pid = pid
+        return local.connection
+
+    def _encode_key(self, key):
+        return json.dumps(key, separators=(',', ':'))
+
+    def _decode_key(self, data):
+        key = json.loads(data)
+        if isinstance(key, list):
+            return tuple(key)
+        return key
+
+    def get(self, key, default=None):
+        """
+        Get a cached value
+        """
+        row = self._connection().execute(
+            'SELECT expires, value FROM entries WHERE key = ?',
+            (self._encode_key(key), )).fetchone()
+        if row is None:
+            return default
+        expires, value = row
+        if expires is not None and expires < time.time():
+            return default
+        return json.loads(value)
+
+    def put(self, key, value):
+        """
+        Store a value
+        """
+        expires = None
+        if self._ttl:
+            expires = time.time() + self._ttl
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO entries (key, expires, value) '
+                'VALUES (?, ?, ?)',
+                (self._encode_key(key), expires, json.dumps(value)))
+        if random.random() < self.PURGE_PROBABILITY:
+            self.purge()
+
+    def purge(self):
+        """
+        Delete the expired entries from the database
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'DELETE FROM entries WHERE expires < ?', (time.time(), ))
+
+    def invalidate(self, key=None):
+        """
+        Drop one entry, or everything when `key` is None
+        """
+        connection = self._connection()
+        with connection:
+            if key is None:
+                connection.execute('DELETE FROM entries')
+            else:
+                connection.execute(
+                    'DELETE FROM entries WHERE key = ?',
+                    (self._encode_key(key), ))
+
+    def invalidate_matching(self, predicate):
+        """
+        Drop every entry whose key satisfies `predicate`
+        """
+        connection = self._connection()
+        with connection:
+            keys = [(data, ) for (data, ) in connection.execute(
+                'SELECT key FROM entries')
+                if predicate(self._decode_key(data))]
+            connection.executemany('DELETE FROM entries WHERE key = ?', keys)
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM entries').fetchone()[0]
@@ -27,9 +27,13 @@
 ###############################################################################
 
 import sys
+import copy
+
+from contextlib import contextmanager
 
 try:
     from suds.client import Client
+    from suds import MethodNotFound, WebFault
 except ImportError, e:
     print "You don't have the python suds library installed."
     sys.exit(1)
@@ -38,17 +42,80 @@ except ImportError, e:
 from constants import *
 from proteus.objects import *
 from dns import DNS
+from ipam import IPAM
+from pool import SessionPool
+from concurrency import run_parallel, SingleFlight
+from cache import LRUCache
+from instrumentation import ReplySizePlugin, instrumented_call, \
+    instrumented_iter, reply_plugin, summarize_arguments
+from tracing import find_tracer
+from fastxml import RawEntity, decode_entity, decode_entity_array, \
+    iter_entities
+from streaming import open_stream
+
+
+def _entity_dict(entity):
+    """
+    Plain dict of an APIEntity, which can be stored in a
+    :py:class:`proteus.api.cache.SharedCache`
+    """
+    data = {}
+    for name in ('id', 'name', 'type', 'properties'):
+        value = getattr(entity, name, None)
+        if isinstance(value, unicode):
+            # suds Text values carry extra slots
+            value = unicode(value)
+        data[name] = value
+    return data
+
+
+# fault strings of servers which don't know a SOAP operation
+_UNKNOWN_OPERATION_FAULTS = (
+    'cannot find dispatch method',
+    'unknown operation',
+    'no such operation',
+)
+
+
+def _is_unknown_operation(fault):
+    message = str(fault).lower()
+    for text in _UNKNOWN_OPERATION_FAULTS:
+        if text in message:
+            return True
+    return False
+
+
+def _close_transport(client):
+    """
+    Close the persistent connection of a suds Client, if it has one
+    """
+    close = getattr(client.options.transport, 'close', None)
+    if close is not None:
+        close()
 
 
 class ProteusClientApi(object):
     """ Low Level Proteus SOAP Wrapper Class"""
-    def __init__(self, api_url=None, api_user=None, api_password=None):
+    def __init__(self, api_url=None, api_user=None, api_password=None,
+                 wsdl_cache=None, pool_size=None, pool_options=None,
+                 instruments=None, fast_decode=False, transport=None,
+                 negative_cache_ttl=None, negative_cache_size=10000,
+                 lookup_cache=None):
         """Constructor
 
         :Parameters:
             - `api_url` : string
             - `api_user` : string
             - `api_password` : string
+            - `wsdl_cache` : :py:class:`proteus.api.cache.WSDLCache` [ optional ]
+            - `pool_size` : int [ optional, max. number of concurrent sessions ]
+            - `pool_options` : dict [ optional, keyword arguments for :py:class:`proteus.api.pool.SessionPool` ]
+            - `instruments` : list of :py:class:`proteus.api.instrumentation.Instrument` [ optional ]
+            - `fast_decode` : bool [ decode getEntityByName and getEntities replies with :py:mod:`proteus.api.fastxml` instead of suds ]
+            - `transport` : suds Transport [ optional, i.e. :py:class:`proteus.api.transport.KeepAliveTransport` ]
+            - `negative_cache_ttl` : int [ optional, seconds getEntityByName remembers entities which don't exist ]
+            - `negative_cache_size` : int [ max. number of remembered missing entities ]
+            - `lookup_cache` : :py:class:`proteus.api.cache.SharedCache` [ optional, cache of the entities found by getEntityByName, can be shared by processes ]
 
         Example:
             >>> from proteus.api import ProteusClientApi
@@ -60,6 +127,20 @@ class ProteusClientApi(object):
         self._api_url = api_url
         self._api_user = api_user
         self._api_password = api_password
+        self._wsdl_cache = wsdl_cache
+        self._pool_size = pool_size
+        self._pool_options = pool_options or {}
+        self._pool = None
+        self._instruments = tuple(instruments or ())
+        self._fast_decode = fast_decode
+        self._transport = transport
+        self._single_flight = SingleFlight()
+        self._unsupported_operations = set()
+        self._lookup_cache = lookup_cache
+        self._negative_cache = None
+        if negative_cache_ttl:
+            self._negative_cache = LRUCache(
+                negative_cache_size, negative_cache_ttl)
         self._client = None
         self._is_connected = None
         self._is_authenticated = None
@@ -72,17 +153,189 @@ class ProteusClientApi(object):
             raise Exception('Disconnect first')
         if self._api_url[-1] != '/':
             self._api_url += '/'
-        self._client = Client('%sServices/API?wsdl' % self._api_url)
-        self._client.set_options(location='%sServices/API' % self._api_url)
+        if self._instruments:
+            self._client = instrumented_call(
+                self._instruments,
+                'connect',
+                summarize_arguments((self._api_url, )),
+                self._load_wsdl)
+        else:
+            self._client = self._load_wsdl()
+        self._client.set_options(
+            location='%sServices/API' % self._api_url,
+            plugins=[ReplySizePlugin()])
         self._is_connected = True
 
+    def _load_wsdl(self):
+        options = {}
+        if self._transport is not None:
+            options['transport'] = self._transport
+        if self._wsdl_cache is not None:
+            return self._wsdl_cache.get_client(self._api_url, **options)
+        return Client('%sServices/API?wsdl' % self._api_url, **options)
+
+    def _call(self, client, operation, *args, **kwargs):
+        """
+        Issue a SOAP call, measured by the configured instruments
+
+        :Parameters:
+            - `client` : suds Client
+            - `operation` : string [ SOAP operation ]
+            - `decode` : callable [ optional keyword argument, the file-like reply is passed to it instead of letting suds unmarshal it ]
+        """
+        decode = kwargs.get('decode')
+        if decode is not None:
+            method = self._raw_method(client, operation, decode)
+        else:
+            method = getattr(client.service, operation)
+        if not self._instruments:
+            return method(*args)
+        if operation == 'login':
+            arguments = summarize_arguments(args[:1] + ('***', ))
+        else:
+            arguments = summarize_arguments(args)
+        return instrumented_call(
+            self._instruments, operation, arguments, method, *args,
+            client=client)
+
+    def _session_call(self, operation, *args, **kwargs):
+        """
+        :py:meth:`_call` with a client from :py:meth:`_session`
+        """
+        with self._session() as client:
+            return self._call(client, operation, *args, **kwargs)
+
+    def invalidate_missing(self, parent_id=None, entity_name=None,
+                           entity_type=None):
+        """
+        Forget remembered missing entities, i.e. after creating one
+
+        Arguments which are None match everything, without arguments the
+        whole negative cache is dropped.
+
+        :Parameters:
+            - `parent_id` : int
+            - `entity_name` : string
+            - `entity_type` : string
+
+        Example:
+            >>> pc.invalidate_missing(zone.id, 'newhost', TYPE_HOSTRECORD)
+        """
+        if self._negative_cache is None:
+            return
+        if parent_id is None and entity_name is None and entity_type is None:
+            self._negative_cache.invalidate()
+            return
+
+        def _match(key):
+            return (parent_id is None or key[0] == parent_id) \
+                and (entity_name is None or key[1] == entity_name) \
+                and (entity_type is None or key[2] == entity_type)
+        self._negative_cache.invalidate_matching(_match)
+
+    def coalescing_stats(self):
+        """
+        Counters of the getEntityByName and getEntities calls, `coalesced`
+        is the number of calls saved because an identical call was in
+        flight already
+
+        :return:
+            dict, see :py:meth:`proteus.api.concurrency.SingleFlight.stats`
+        """
+        return self._single_flight.stats()
+
+    def _raw_method(self, client, operation, decode):
+        """
+        Build a function issuing a SOAP call and returning decode(reply)
+
+        suds only marshals the request, the reply is passed to `decode` as
+        the unread file-like body, see :py:func:`proteus.api.streaming.open_stream`.
+        """
+        def _raw(*args):
+            reply = open_stream(client, operation, *args)
+            try:
+                return decode(reply)
+            finally:
+                reply.close()
+                plugin = reply_plugin(client)
+                if plugin is not None:
+                    plugin.size = reply.size
+        return _raw
+
+    def add_instrument(self, instrument):
+        """
+        Report all further SOAP calls to an instrument
+
+        :Parameters:
+            - `instrument` : :py:class:`proteus.api.instrumentation.Instrument`
+
+        Example:
+            >>> from proteus.api.instrumentation import MetricsAggregator
+            >>> metrics=MetricsAggregator()
+            >>> pc.add_instrument(metrics)
+            >>> pc.DNS.get_host_record('host', 'domain.tld', view_name='Internal')
+            >>> print metrics.report()
+        """
+        self._instruments = self._instruments + (instrument, )
+
+    def remove_instrument(self, instrument):
+        """
+        Stop reporting SOAP calls to an instrument
+        """
+        self._instruments = tuple(
+            i for i in self._instruments if i is not instrument)
+
     def _disconnect(self):
         """
         Disconnect from Proteus SOAP Service
         """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self._client is not None:
+            _close_transport(self._client)
         self._client = None
         self._is_connected = False
 
+    def _open_soap_session(self):
+        """
+        Clone the connected suds Client and login with the clone
+        """
+        client = self._client.clone()
+        self._call(client, 'login', self._api_user, self._api_password)
+        return client
+
+    def _close_soap_session(self, client):
+        try:
+            self._call(client, 'logout')
+        finally:
+            _close_transport(client)
+
+    def _check_soap_session(self, client):
+        """
+        Health check for pooled sessions, uses getSystemInfo when available
+        """
+        try:
+            client.service.getSystemInfo
+        except MethodNotFound:
+            return True
+        self._call(client, 'getSystemInfo')
+        return True
+
+    @contextmanager
+    def _session(self):
+        """
+        Context manager yielding a suds Client for a single SOAP call
+
+        With a session pool the Client is checked out of the pool,
+        otherwise the single connection of this instance is used.
+        """
+        if self._pool is None:
+            yield self._client
+        else:
+            with self._pool.session() as client:
+                yield client
+
     def login(self):
         """
         Connect and login
@@ -97,8 +350,19 @@ class ProteusClientApi(object):
         """
         try:
             self._connect()
-            self._client.service.login(self._api_user, self._api_password)
+            self._call(
+                self._client, 'login', self._api_user, self._api_password)
             self._is_authenticated = True
+            if self._pool_size is not None:
+                options = dict(
+                    close=self._close_soap_session,
+                    health_check=self._check_soap_session)
+                options.update(self._pool_options)
+                self._pool = SessionPool(
+                    self._open_soap_session,
+                    max_size=self._pool_size,
+                    **options)
+                self._pool.fill()
             return True
         except Exception, e:
             print e
@@ -119,35 +383,155 @@ class ProteusClientApi(object):
             >>> pc.logout()
         """
         try:
-            self._client.service.logout()
+            self._call(self._client, 'logout')
             self._is_authenticated = False
             self._disconnect()
             return True
         except Exception, e:
             print e
 
+    def _new_session(self):
+        """
+        Open an additional, independently authenticated connection
+
+        :return:
+            logged in :py:class:`ProteusClientApi`
+        """
+        session = ProteusClientApi(
+            self._api_url,
+            self._api_user,
+            self._api_password,
+            self._wsdl_cache,
+            instruments=self._instruments,
+            fast_decode=self._fast_decode,
+            transport=copy.deepcopy(self._transport))
+        # coalesce and cache the calls of all sessions together
+        session._single_flight = self._single_flight
+        session._negative_cache = self._negative_cache
+        session._lookup_cache = self._lookup_cache
+        session._unsupported_operations = self._unsupported_operations
+        if not session.login():
+            raise Exception('Login failed')
+        return session
+
+    @contextmanager
+    def _worker_sessions(self, workers):
+        """
+        Context manager yielding sessions for several :py:meth:`_run_parallel`
+        calls, so the workers log in only once. They are logged out at the
+        end of the block.
+
+        :return:
+            :py:class:`proteus.api.pool.SessionPool`, None when this client is thread safe
+        """
+        if self.is_thread_safe():
+            yield None
+            return
+        sessions = SessionPool(
+            self._new_session,
+            lambda session: session.logout(),
+            min_size=0,
+            max_size=workers,
+            idle_timeout=None)
+        try:
+            yield sessions
+        finally:
+            sessions.close()
+
+    def _run_parallel(self, func, items, workers, sessions=None):
+        """
+        Run func(client, item) for all items with bounded concurrency
+
+        The workers share this client when it has a session pool, otherwise
+        every worker logs in with its own session, or takes one from
+        `sessions`. With a tracer the spans of the workers are nested below
+        the span of the caller.
+
+        :Parameters:
+            - `sessions` : :py:class:`proteus.api.pool.SessionPool` [ optional, see :py:meth:`_worker_sessions` ]
+
+        :return:
+            see :py:func:`proteus.api.concurrency.run_parallel`
+        """
+        setup = self._new_session
+        teardown = lambda session: session.logout()
+        if sessions is not None:
+            setup = sessions.checkout
+            teardown = sessions.checkin
+        tracer = find_tracer(self)
+        if tracer is not None:
+            # nest the spans of the workers below the calling span
+            func = tracer.wrap(func)
+            setup = tracer.wrap(setup)
+            teardown = tracer.wrap(teardown)
+        if self.is_thread_safe():
+            return run_parallel(
+                lambda item: func(self, item),
+                items,
+                workers)
+        return run_parallel(
+            func,
+            items,
+            workers,
+            setup=setup,
+            teardown=teardown)
+
     def _get_entity_by_name(self, parent_id, entity_name, entity_type):
         """
         Wrapper for Proteus SOAP API Method getEntityByName
 
+        Concurrent identical calls are coalesced into one SOAP call. With
+        a negative cache, entities which don't exist are remembered and
+        asked for again only after `negative_cache_ttl` seconds. With a
+        lookup cache, found entities are taken from it and put into it.
+
         :Parameters:
             - `parent_id` : int
             - `entity_name` : string
             - `entity_type` : string [ use one of the TYPE_* constants from :py:mod:`proteus.api.constants` ]
 
         :return:
-            APIEntity
+            APIEntity, :py:class:`proteus.api.fastxml.RawEntity` with fast_decode or from the lookup cache
 
         """
         if entity_type not in ALL_TYPES:
             raise Exception("Unknown Entity Type")
+        decode = None
+        if self._fast_decode:
+            decode = decode_entity
         if self._is_connected:
+            key = (parent_id, entity_name, entity_type)
+            negative_cache = self._negative_cache
+            if negative_cache is not None:
+                missing = negative_cache.get(key)
+                if missing is not None:
+                    return missing
+            lookup_cache = self._lookup_cache
+            if lookup_cache is not None:
+                found = lookup_cache.get((self._api_url, ) + key)
+                if found is not None:
+                    entity = RawEntity(found)
+                    entity['id'] = long(entity['id'])
+                    return entity
             try:
-                entity = self._client.service.getEntityByName(
+                entity = self._single_flight.do(
+                    ('getEntityByName', ) + key,
+                    self._session_call,
+                    'getEntityByName',
                     parent_id,
                     entity_name,
-                    entity_type
+                    entity_type,
+                    decode=decode
                 )
+                if entity is None:
+                    return entity
+                if getattr(entity, 'id', None):
+                    if lookup_cache is not None:
+                        lookup_cache.put(
+                            (self._api_url, ) + key, _entity_dict(entity))
+                elif negative_cache is not None:
+                    # the empty APIEntity of a missing entity
+                    negative_cache.put(key, entity)
                 return entity
             except Exception, e:
                 print e
@@ -158,6 +542,8 @@ class ProteusClientApi(object):
         """
         Get a list of Proteus Entities
 
+        Concurrent identical calls are coalesced into one SOAP call.
+
         :Parameters:
             - `parent_id` : int
             - `entity_type` : string [ use one of the TYPE_* constants from :py:mod:`proteus.api.constants` ]
@@ -165,15 +551,22 @@ class ProteusClientApi(object):
             - `count` : int
 
         :return:
-            `APIEntityArray`
+            `APIEntityArray`, :py:class:`proteus.api.fastxml.RawEntityArray` with fast_decode
         """
+        decode = None
+        if self._fast_decode:
+            decode = decode_entity_array
         if self._is_connected:
             try:
-                entity = self._client.service.getEntities(
+                entity = self._single_flight.do(
+                    ('getEntities', parent_id, entity_type, start, count),
+                    self._session_call,
+                    'getEntities',
                     parent_id,
                     entity_type,
                     start,
-                    count
+                    count,
+                    decode=decode
                 )
                 return entity
             except Exception, e:
@@ -181,6 +574,171 @@ class ProteusClientApi(object):
                 return False
         return None
 
+    def _search_by_absolute_name(self, absolute_name, name, entity_type,
+                                 count=10):
+        """
+        Search entities by their absolute name with a single SOAP call
+
+        HostRecords are searched with getHostRecordsByHint, other types
+        with searchByObjectTypes by their own `name`, which may contain
+        dots itself. The caller has to check the absoluteName of the
+        results.
+        Once the server turned out not to know an operation it isn't
+        called again.
+
+        :Parameters:
+            - `absolute_name` : string [ i.e. 'host.subdomain.domain.tld' ]
+            - `name` : string [ name of the entity in its zone, i.e. 'host' ]
+            - `entity_type` : string [ use one of the TYPE_* constants from :py:mod:`proteus.api.constants` ]
+            - `count` : int [ max. number of entities returned ]
+
+        :return:
+            list of APIEntity, :py:class:`proteus.api.fastxml.RawEntity` with fast_decode, or None when the server can't search
+
+        :raise:
+            Exception when the search fails
+        """
+        if entity_type == TYPE_HOSTRECORD:
+            operation = 'getHostRecordsByHint'
+            args = (0, count, 'hint=^%s$|' % absolute_name)
+        else:
+            operation = 'searchByObjectTypes'
+            args = ('^%s$' % name, entity_type, 0, count)
+        if operation in self._unsupported_operations:
+            return None
+        decode = None
+        if self._fast_decode:
+            decode = decode_entity_array
+        try:
+            result = self._session_call(operation, *args, decode=decode)
+        except MethodNotFound:
+            # not in the WSDL of the server
+            self._unsupported_operations.add(operation)
+            return None
+        except WebFault, e:
+            if not _is_unknown_operation(e):
+                raise
+            self._unsupported_operations.add(operation)
+            return None
+        return list(getattr(result, 'item', None) or [])
+
+    def _stream_entities(self, parent_id, entity_type, start, count):
+        """
+        Call getEntities and decode the reply while it is received
+
+        Every item is yielded as soon as it is complete and released
+        afterwards, so the memory use doesn't depend on `count`. The
+        session stays checked out until the generator is exhausted or
+        closed.
+
+        :return:
+            generator of :py:class:`proteus.api.fastxml.RawEntity`
+        """
+        if not self._is_connected:
+            return
+        with self._session() as client:
+            reply = open_stream(
+                client, 'getEntities', parent_id, entity_type, start, count)
+            try:
+                items = iter_entities(reply, 'item')
+                if self._instruments:
+                    items = instrumented_iter(
+                        self._instruments,
+                        'getEntities',
+                        summarize_arguments(
+                            (parent_id, entity_type, start, count)),
+                        items,
+                        size=lambda: reply.size)
+                for item in items:
+                    yield item
+            finally:
+                reply.close()
+
+    def _iter_entities(self, parent_id, entity_type,
+                       page_size=DEFAULT_PAGE_SIZE, strict=False,
+                       stream=False):
+        """
+        Page through getEntities and yield the raw APIEntity items
+
+        :Parameters:
+            - `parent_id` : int
+            - `entity_type` : string [ use one of the TYPE_* constants from :py:mod:`proteus.api.constants` ]
+            - `page_size` : int
+            - `strict` : bool [ raise instead of stopping when a call fails ]
+            - `stream` : bool [ decode every page while it is received, see :py:meth:`_stream_entities` ]
+
+        :return:
+            generator of `APIEntity`, :py:class:`proteus.api.fastxml.RawEntity` with stream or fast_decode
+        """
+        start = 0
+        while True:
+            if stream:
+                received = 0
+                try:
+                    for item in self._stream_entities(
+                            parent_id, entity_type, start, page_size):
+                        received += 1
+                        yield item
+                except Exception:
+                    # like a failed page below, stop unless strict
+                    if strict:
+                        raise
+                    return
+            else:
+                entities = self._get_entities(
+                    parent_id,
+                    entity_type,
+                    start,
+                    page_size)
+                if strict and (entities is None or entities is False):
+                    raise Exception(
+                        'getEntities failed for parent %s' % parent_id)
+                items = getattr(entities, 'item', None)
+                if not items:
+                    return
+                for item in items:
+                    yield item
+                received = len(items)
+            if received < page_size:
+                return
+            start += page_size
+
+    def iter_entities(self, parent_id, entity_type,
+                      page_size=DEFAULT_PAGE_SIZE, stream=False):
+        """
+        Iterate over a list of Proteus Entities, one page at a time
+
+        :Parameters:
+            - `parent_id` : int
+            - `entity_type` : string [ use one of the TYPE_* constants from :py:mod:`proteus.api.constants` ]
+            - `page_size` : int [ entities fetched per getEntities call ]
+            - `stream` : bool [ decode the pages while they are received, memory use is then independent of `page_size` ]
+
+        :return:
+            generator of :py:class:`proteus.objects.apientity.APIObject`
+
+        :raise:
+            Exception when a getEntities call fails, the listing is never
+            cut short silently
+
+        Example:
+            >>> for zone in pc.iter_entities(view.id, TYPE_ZONE, 500):
+            ...     print zone.name
+        """
+        for item in self._iter_entities(
+                parent_id, entity_type, page_size, strict=True,
+                stream=stream):
+            entity = APIObject(TypeRecord=item, client=self)
+            if entity is not None:
+                yield entity
+
+    def is_thread_safe(self):
+        """
+        Checks if SOAP calls may be issued from several threads at once,
+        which is the case when a session pool is configured
+        """
+        return self._pool is not None
+
     def is_valid_connection(self):
         """
         Checks if the client is connected and authenticated
@@ -199,13 +757,31 @@ class ProteusClient(ProteusClientApi):
         api_url=None,
         api_user=None,
         api_password=None,
-        config_name=None):
+        config_name=None,
+        wsdl_cache=None,
+        pool_size=None,
+        pool_options=None,
+        instruments=None,
+        fast_decode=False,
+        transport=None,
+        negative_cache_ttl=None,
+        lookup_cache=None,
+        server_search=False):
         """
         :Parameters:
             - `api_url` : string
             - `api_user` : string
             - `api_password` : string
             - `config_name` : string
+            - `wsdl_cache` : :py:class:`proteus.api.cache.WSDLCache` [ optional ]
+            - `pool_size` : int [ optional, max. number of concurrent sessions ]
+            - `pool_options` : dict [ optional, keyword arguments for :py:class:`proteus.api.pool.SessionPool` ]
+            - `instruments` : list of :py:class:`proteus.api.instrumentation.Instrument` [ optional ]
+            - `fast_decode` : bool [ see :py:class:`ProteusClientApi` ]
+            - `transport` : suds Transport [ see :py:class:`ProteusClientApi` ]
+            - `negative_cache_ttl` : int [ see :py:class:`ProteusClientApi` ]
+            - `lookup_cache` : :py:class:`proteus.api.cache.SharedCache` [ see :py:class:`ProteusClientApi` ]
+            - `server_search` : bool [ find records by their absolute name with one search call, see :py:meth:`proteus.api.dns.DNS._search_record` ]
 
         Example:
             >>> from proteus.api import ProteusClientApi
@@ -216,11 +792,15 @@ class ProteusClient(ProteusClientApi):
                 'proteus_configuration_object_name')
 
         """
-        super(ProteusClient, self).__init__(api_url, api_user, api_password)
+        super(ProteusClient, self).__init__(
+            api_url, api_user, api_password, wsdl_cache, pool_size,
+            pool_options, instruments, fast_decode, transport,
+            negative_cache_ttl, lookup_cache=lookup_cache)
         self._config_name = config_name
         self._configuration = None
         self._get_configuration()
-        self._dns = DNS(self)
+        self._dns = DNS(self, server_search=server_search)
+        self._ipam = IPAM(self)
 
     def _get_configuration(self):
         if self.is_valid_connection():
@@ -243,6 +823,10 @@ class ProteusClient(ProteusClientApi):
         return self._dns
     DNS = property(get_dns, doc='DNS Class Property')
 
+    def get_ipam(self):
+        return self._ipam
+    IPAM = property(get_ipam, doc='IPAM Class Property')
+
     def get_configuration(self):
         if self._configuration is None:
             self._get_configuration()
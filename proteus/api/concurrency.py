@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+import threading
+import Queue
+
+
+def run_parallel(func, items, workers=4, setup=None, teardown=None):
+    """
+    Run `func` over `items` in a bounded pool of worker threads
+
+    When `setup` is given every worker calls it once and passes the
+    returned state as first argument to `func`, i.e. a logged in session,
+    and hands it to `teardown` when the work is done.
+
+    :Parameters:
+        - `func` : callable [ func(item) or func(state, item) ]
+        - `items` : iterable
+        - `workers` : int [ max. number of threads ]
+        - `setup` : callable [ optional, creates the per worker state ]
+        - `teardown` : callable [ optional, releases the per worker state ]
+
+    :return:
+        tuple of ( list of results in input order, dict of input index -> exception )
+    """
+    items = list(items)
+    if len(items) == 0:
+        return [], {}
+    results = [None] * len(items)
+    errors = {}
+    pending = Queue.Queue()
+    for index, item in enumerate(items):
+        pending.put((index, item))
+    done = set()
+    setup_errors = []
+
+    def _worker():
+        state = None
+        if setup is not None:
+            try:
+                state = setup()
+            except Exception, e:
+                setup_errors.append(e)
+                return
+        try:
+            while True:
+                try:
+                    index, item = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    if setup is not None:
+                        results[index] = func(state, item)
+                    else:
+                        results[index] = func(item)
+                except Exception, e:
+                    errors[index] = e
+                done.add(index)
+        finally:
+            if teardown is not None:
+                try:
+                    teardown(state)
+                except Exception:
+                    pass
+
+    workers = max(1, min(workers, len(items)))
+    if workers == 1:
+        _worker()
+    else:
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=_worker)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    for index in range(len(items)):
+        if index not in done and index not in errors:
+            errors[index] = setup_errors[0]
+    return results, errors
+
+
+class Future(object):
+    """
+    Result of an asynchronous call
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def _finish(self):
+        self._event.set()
+        with self._lock:
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._finish()
+
+    def done(self):
+        """
+        Checks if the call has finished
+        """
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """
+        Wait for the call and return its result, re-raises its exception
+
+        :Parameters:
+            - `timeout` : int [ seconds, None waits forever ]
+        """
+        if not self._event.wait(timeout):
+            raise Exception('Timeout waiting for result')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Wait for the call and return its exception or None
+        """
+        if not self._event.wait(timeout):
+            raise Exception('Timeout waiting for result')
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Call `callback` with this future once the call has finished
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+
+class WorkerPool(object):
+    """
+    Fixed size pool of worker threads executing submitted calls
+    """
+    def __init__(self, workers=4):
+        """
+        :Parameters:
+            - `workers` : int [ max. number of calls running at once ]
+        """
+        self._workers = max(workers, 1)
+        self._jobs = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            future, func, args, kwargs = job
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception, e:
+                future.set_exception(e)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a call
+
+        :return:
+            :py:class:`Future`
+        """
+        with self._lock:
+            if self._shutdown:
+                raise Exception('Worker pool is shut down')
+            if len(self._threads) < self._workers:
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        future = Future()
+        self._jobs.put((future, func, args, kwargs))
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers once the queued calls are done
+        """
+        with self._lock:
+            self._shutdown = True
+            threads = self._threads
+        for thread in threads:
+            self._jobs.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent identical calls
+
+    While a call for a key is in flight, further calls for the same key
+    don't run `func` themselves, they wait for the running call and share
+    its result or exception.
+
+    Example:
+        >>> flight=SingleFlight()
+        >>> flight.do(('getEntityByName', parent_id, name, type), fetch)
+        >>> flight.stats()
+        {'calls': 10, 'coalesced': 7}
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._calls = 0
+        self._coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) unless a call for `key` is running
+        already, then wait for that one
+
+        :Parameters:
+            - `key` : hashable
+            - `func` : callable
+
+        :return:
+            result of the call
+        """
+        with self._lock:
+            self._calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+        if not leader:
+            return future.result()
+        result = error = None
+        succeeded = False
+        try:
+            result = func(*args, **kwargs)
+            succeeded = True
+        except Exception, e:
+            error = e
+            raise
+        except BaseException, e:
+            # don't raise i.e. KeyboardInterrupt in the waiting threads
+            error = Exception('Coalesced call was interrupted: %r' % e)
+            raise
+        finally:
+            self._forget(key)
+            if succeeded:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        return result
+
+    def _forget(self, key):
+        with self._lock:
+            del self._in_flight[key]
+
+    def stats(self):
+        """
+        Get the counters
+
+        :return:
+            dict with the number of `calls` and of the `coalesced` ones,
+            which didn't issue a call of their own
+        """
+        with self._lock:
+            return dict(calls=self._calls, coalesced=self._coalesced)
+
+    def reset(self):
+        """
+        Reset the counters
+        """
+        with self._lock:
+            self._calls = 0
+            self._coalesced = 0
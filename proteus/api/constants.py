@@ -29,9 +29,14 @@ TYPE_TXTRECORD = 'TXTRecord'
 TYPE_CNAMERECORD = 'AliasRecord'
 TYPE_HINFORECORD = 'HINFORecord'
 TYPE_SRVRECORD = 'SRVRecord'
+TYPE_SOARECORD = 'StartOfAuthority'
+TYPE_DNSOPTION = 'DNSOption'
 
 TYPE_IP4BLOCK = 'IP4Block'
 
+# number of entities requested per getEntities call when paging
+DEFAULT_PAGE_SIZE = 1000
+
 
 DNS_ALLTYPES = [
     TYPE_ZONE,
@@ -53,5 +58,7 @@ ALL_TYPES = (
     TYPE_CNAMERECORD,
     TYPE_HINFORECORD,
     TYPE_SRVRECORD,
+    TYPE_SOARECORD,
+    TYPE_DNSOPTION,
     TYPE_IP4BLOCK
     )
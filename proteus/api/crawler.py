@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Breadth-first crawl of a whole configuration
+
+Configuration -> Views -> Zones (recursively) -> Resource Records. The
+children of several containers are listed at once by a bounded pool of
+worker threads, the entities are yielded while the crawl goes on.
+"""
+
+import os
+import json
+import Queue
+import tempfile
+import threading
+
+from constants import *
+from proteus.objects import *
+
+
+STATE_VERSION = 1
+
+_CONTAINER_CHILDREN = {
+    TYPE_CONFIGURATION: (TYPE_VIEW, ),
+    TYPE_VIEW: (TYPE_ZONE, ),
+    TYPE_ZONE: (TYPE_ZONE, ),
+}
+
+
+class CrawledEntity(object):
+    """
+    An entity found by the crawler
+
+    `path` holds the names of its parents, starting with the configuration,
+    `depth` is 0 for the configuration, 1 for views, 2 for top level zones
+    and so on.
+    """
+    __slots__ = ('entity', 'parent_id', 'path', 'depth')
+
+    def __init__(self, entity, parent_id, path, depth):
+        self.entity = entity
+        self.parent_id = parent_id
+        self.path = path
+        self.depth = depth
+
+    def __repr__(self):
+        return '<CrawledEntity %s %s below %s>' % (
+            self.entity.type, self.entity.name, '/'.join(self.path))
+
+
+def _node(entity, path, depth):
+    """
+    JSON serializable description of a container which is still to be
+    listed
+    """
+    properties = None
+    if entity.properties is not None:
+        properties = entity.properties._property_string
+    return dict(id=entity.id, name=entity.name, type=entity.type,
+                properties=properties, path=list(path), depth=depth)
+
+
+class ConfigurationCrawler(object):
+    """
+    Parallel breadth-first crawler
+
+    Every worker lists containers with its own session, unless the client
+    has a session pool which the workers share. With `state_path` the
+    containers which are still to be listed are saved from time to time,
+    when the crawl fails or is stopped. The next crawl then resumes with
+    them, entities of containers which weren't finished are yielded once
+    more.
+
+    Example:
+        >>> from proteus.api.crawler import ConfigurationCrawler
+        >>> crawler=ConfigurationCrawler(pc, workers=8,
+                state_path='/var/lib/proteus/crawl.json')
+        >>> for item in crawler.crawl(record_types=[TYPE_HOSTRECORD]):
+        ...     print '/'.join(item.path), item.entity.name
+    """
+    def __init__(self, client, workers=4, page_size=DEFAULT_PAGE_SIZE,
+                 state_path=None, save_interval=100):
+        """
+        :Parameters:
+            - `client` : :py:class:`proteus.api.client.ProteusClient`
+            - `workers` : int [ max. number of containers listed at once ]
+            - `page_size` : int
+            - `state_path` : string [ optional, file the crawl state is saved in ]
+            - `save_interval` : int [ save the state after this many listed containers ]
+        """
+        self._client = client
+        self._workers = max(workers, 1)
+        self._page_size = page_size
+        self._state_path = state_path
+        self._save_interval = save_interval
+        self._pending = {}
+        self._done = set()
+        self.errors = {}
+        if state_path is not None and os.path.exists(state_path):
+            f = open(state_path, 'rb')
+            try:
+                state = json.load(f)
+            finally:
+                f.close()
+            if state.get('version') == STATE_VERSION:
+                for node in state['pending']:
+                    self._pending[node['id']] = node
+                self._done = set(state['done'])
+
+    def save(self):
+        """
+        Write the containers which are still to be listed to `state_path`
+        """
+        if self._state_path is None:
+            return
+        state = dict(version=STATE_VERSION,
+                     pending=self._pending.values(),
+                     done=list(self._done))
+        directory = os.path.dirname(os.path.abspath(self._state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        f = os.fdopen(fd, 'wb')
+        try:
+            json.dump(state, f)
+        finally:
+            f.close()
+        os.rename(tmp_path, self._state_path)
+
+    def reset(self):
+        """
+        Forget the saved state, the next crawl starts from scratch
+        """
+        self._pending = {}
+        self._done = set()
+        self.errors = {}
+        if self._state_path is not None and os.path.exists(self._state_path):
+            os.remove(self._state_path)
+
+    def _list(self, session, node, record_types):
+        """
+        Yield the children of a container as :py:class:`CrawledEntity`
+        """
+        depth = node['depth'] + 1
+        path = node['path'] + [node['name']]
+        child_types = list(_CONTAINER_CHILDREN.get(node['type'], ()))
+        if node['type'] == TYPE_ZONE:
+            child_types.extend(record_types)
+        for child_type in child_types:
+            for item in session._iter_entities(
+                    node['id'], child_type, self._page_size, strict=True):
+                entity = APIObject(TypeRecord=item, client=self._client)
+                if entity is not None:
+                    yield CrawledEntity(entity, node['id'], tuple(path), depth)
+
+    def _work(self, work, results, stop, record_types):
+        def _put(message):
+            # the consumer may have stopped reading
+            while not stop.is_set():
+                try:
+                    results.put(message, timeout=0.1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        session = self._client
+        try:
+            if not self._client.is_thread_safe():
+                session = self._client._new_session()
+        except Exception, e:
+            _put(('failed', e))
+            return
+        try:
+            while not stop.is_set():
+                node = work.get()
+                if node is None:
+                    return
+                try:
+                    for item in self._list(session, node, record_types):
+                        if not _put(('entity', item)):
+                            return
+                except Exception, e:
+                    _put(('error', node, e))
+                else:
+                    _put(('done', node))
+        finally:
+            if session is not self._client:
+                try:
+                    session.logout()
+                except Exception:
+                    pass
+
+    def crawl(self, max_depth=None, entity_types=None,
+              record_types=DNS_ALLTYPES):
+        """
+        Crawl the configuration of the client breadth-first
+
+        Use the same filters when resuming a crawl.
+
+        :Parameters:
+            - `max_depth` : int [ optional, deepest level listed, 1 stops at the views ]
+            - `entity_types` : list of entity types [ optional, only these are yielded, containers are crawled anyway ]
+            - `record_types` : list of record types [ fetched for every zone ]
+
+        :return:
+            generator of :py:class:`CrawledEntity`
+
+        :raise:
+            Exception when no worker can login
+        """
+        if entity_types is not None:
+            record_types = [t for t in record_types if t in entity_types]
+        record_types = [t for t in record_types if t != TYPE_ZONE]
+        self.errors = {}
+        if len(self._pending) == 0:
+            configuration = self._client.Configuration
+            if configuration is None:
+                raise Exception('Unknown configuration')
+            self._done = set()
+            if entity_types is None or TYPE_CONFIGURATION in entity_types:
+                yield CrawledEntity(configuration, None, (), 0)
+            if max_depth is None or max_depth > 0:
+                node = _node(configuration, (), 0)
+                self._pending[node['id']] = node
+
+        work = Queue.Queue()
+        results = Queue.Queue(self._workers * self._page_size)
+        stop = threading.Event()
+        for node in self._pending.values():
+            work.put(node)
+        running = len(self._pending)
+        workers = min(self._workers, max(running, 1))
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._work,
+                args=(work, results, stop, record_types))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        failed = []
+        listed = 0
+        try:
+            while running > 0:
+                message = results.get()
+                if message[0] == 'entity':
+                    item = message[1]
+                    entity = item.entity
+                    if entity.type in _CONTAINER_CHILDREN \
+                        and entity.id not in self._done \
+                        and entity.id not in self._pending \
+                        and (max_depth is None or item.depth < max_depth):
+                        node = _node(entity, item.path, item.depth)
+                        self._pending[node['id']] = node
+                        work.put(node)
+                        running += 1
+                    if entity_types is None or entity.type in entity_types:
+                        yield item
+                elif message[0] == 'done':
+                    node = message[1]
+                    del self._pending[node['id']]
+                    self._done.add(node['id'])
+                    running -= 1
+                    listed += 1
+                    if listed % self._save_interval == 0:
+                        self.save()
+                elif message[0] == 'error':
+                    # stays pending, the next crawl retries it
+                    node = message[1]
+                    self.errors[tuple(node['path'] + [node['name']])] = \
+                        message[2]
+                    running -= 1
+                else:
+                    failed.append(message[1])
+                    if len(failed) == workers:
+                        raise failed[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+            if len(self._pending) == 0:
+                # finished, the next crawl starts from scratch
+                self._done = set()
+            self.save()
@@ -20,6 +20,8 @@
 import sys
 
 from constants import *
+from cache import LRUCache
+from tracing import traced
 from proteus.objects import *
 
 try:
@@ -32,14 +34,144 @@ except ImportError, e:
 class DNS(object):
     """Proteus DNS Management Class"""
 
-    def __init__(self, proteus_client=None):
+    def __init__(self, proteus_client=None, zone_cache_size=1024,
+                 zone_cache_ttl=300, server_search=False):
         """
         :Parameters:
             - `proteus_client` : instance of :py:class:`proteus.api.client.ProteusClient`
+            - `zone_cache_size` : int [ max. number of cached views and zone paths ]
+            - `zone_cache_ttl` : int [ seconds until a cached zone path is resolved again ]
+            - `server_search` : bool [ find records with one search call, see :py:meth:`_search_record` ]
 
         """
         self._client = proteus_client
+        self._server_search = server_search
+        self._view_cache = LRUCache(zone_cache_size, zone_cache_ttl)
+        self._zone_cache = LRUCache(zone_cache_size, zone_cache_ttl)
 
+    def _resolve_zone_path(self, zonename, parent_view, strict=True):
+        """Resolve a dotted zone name below a view, label by label
+
+        Resolved zones are cached per (view id, dotted zone suffix), so the
+        walk starts at the longest suffix which is already known.
+
+        :param zonename: Zonename i.e. 'subdomain.domain.tld'
+        :type zonename: str
+        :param parent_view: View Object
+        :type parent_view: :py:class:`proteus.objects.apientity.View`
+        :param strict: return None when a label can't be resolved, otherwise
+            skip the label and continue below the last resolved zone
+        :type strict: bool
+
+        :returns: :py:class:`proteus.objects.apientity.Zone`
+
+        See: [#private_method]_
+        """
+        view_id = parent_view.id
+        zone_arr = zonename.lower().split('.')
+        parent = parent_view
+        start = len(zone_arr)
+        for i in range(len(zone_arr)):
+            zone = self._zone_cache.get((view_id, '.'.join(zone_arr[i:])))
+            if zone is not None:
+                parent = zone
+                start = i
+                break
+        cacheable = True
+        for i in reversed(range(start)):
+            zone = self.get_zone(zone_arr[i], parent)
+            if not zone:
+                if strict:
+                    return None
+                cacheable = False
+                continue
+            if cacheable:
+                self._zone_cache.put((view_id, '.'.join(zone_arr[i:])), zone)
+            parent = zone
+        return parent
+
+    def invalidate_zone_cache(self, zonename=None, view=None):
+        """Drop cached views and zone paths
+
+        :param zonename: Zonename i.e. 'subdomain.domain.tld', drops the zone
+            and everything below it. None drops the whole cache.
+        :type zonename: str
+        :param view: only drop entries of this View, and the View itself
+        :type view: :py:class:`proteus.objects.apientity.View`
+        """
+        if zonename is None and view is None:
+            self._view_cache.invalidate()
+            self._zone_cache.invalidate()
+            return
+        view_id = None
+        if view is not None:
+            view_id = view.id
+            view_name = (view.name or '').lower()
+            # cached under the name the caller asked for
+            self._view_cache.invalidate_matching(
+                lambda key: key.lower() == view_name)
+        suffix = None
+        if zonename is not None:
+            suffix = zonename.lower()
+
+        def _match(key):
+            if view_id is not None and key[0] != view_id:
+                return False
+            if suffix is None:
+                return True
+            return key[1] == suffix or key[1].endswith('.' + suffix)
+        self._zone_cache.invalidate_matching(_match)
+
+
+    def _search_record(self, hostname, zonename, parent_view, rec_type):
+        """Find a Resource Record by its absolute name with one search call
+
+        The search covers all views, so only a single result whose
+        absoluteName matches is accepted, and it has to belong to
+        `parent_view` if the server reports a viewId. When the server
+        doesn't support the search operations, finds nothing, or finds
+        several records, None is returned and the zones have to be walked.
+        Only enable it when a record name is unique across the views, or
+        when the server reports the viewId.
+
+        :param hostname: the hostname
+        :type hostname: str
+        :param zonename: Zonename i.e. 'subdomain.domain.tld'
+        :type zonename: str
+        :param parent_view: View Object
+        :type parent_view: :py:class:`proteus.objects.apientity.View`
+        :param rec_type: Record type to retrieve
+        :type rec_type: str
+
+        :returns: Resource Record or None
+
+        See: [#private_method]_
+        """
+        absolute_name = ('%s.%s' % (hostname, zonename)).lower()
+        try:
+            items = self._client._search_by_absolute_name(
+                absolute_name, hostname, rec_type)
+        except Exception, e:
+            print e
+            return None
+        if not items:
+            return None
+        found = []
+        for item in items:
+            record = APIObject(TypeRecord=item, client=self._client)
+            if record is None or record.properties is None \
+                or record.type.lower() != rec_type.lower():
+                continue
+            name = getattr(record.properties, 'absoluteName', None)
+            if name is None or name.lower() != absolute_name:
+                continue
+            view_id = getattr(record.properties, 'viewId', None)
+            if view_id is not None and long(view_id) != parent_view.id:
+                continue
+            found.append(record)
+        if len(found) != 1:
+            return None
+        return found[0]
 
     def _get_record(
         self,
@@ -51,6 +183,9 @@ class DNS(object):
         """
         Generic method to retrieve the Proteus Resource Records
 
+        With `server_search` the record is searched by its absolute name
+        first, the zones are only walked when that doesn't find it.
+
         :Parameters:
             - `hostname` : string
             - `zonename` : string
@@ -72,30 +207,23 @@ class DNS(object):
         """
 
         if self._client.is_valid_connection():
-            if view is not None:
-                zone_arr = zonename.split(".")
-                count = len(zone_arr)
-                parent_view = view.id
+            parent_view = view
             if view_name is not None:
-                view_rec = self.get_view(view_name)
-                zone_arr = zonename.split('.')
-                count = len(zone_arr)
-                parent_view = view_rec
-            for i in reversed(zone_arr):
-                if count != 0:
-                    zone = self.get_zone(i, parent_view)
-                    if zone is not None:
-                        parent_view = zone
-                if count == 1:
-                    record = self._client._get_entity_by_name(
-                        parent_view.id,
-                        hostname,
-                        rec_type)
-                    if record is not None:
-                        return APIObject(TypeRecord=record, client=self._client)
-                    else:
-                        return None
-                count = count - 1
+                parent_view = self.get_view(view_name)
+            if parent_view is None:
+                return None
+            if self._server_search:
+                record = self._search_record(
+                    hostname, zonename, parent_view, rec_type)
+                if record is not None:
+                    return record
+            zone = self._resolve_zone_path(zonename, parent_view, strict=False)
+            record = self._client._get_entity_by_name(
+                zone.id,
+                hostname,
+                rec_type)
+            if record is not None:
+                return APIObject(TypeRecord=record, client=self._client)
         return None
 
     def _find_zone(self, zonename, view=None, view_name=None):
@@ -113,32 +241,23 @@ class DNS(object):
         See: [#private_method]_         
         """
         if self._client.is_valid_connection():
-            if view is not None:
-                parent_view = view
+            parent_view = view
             if view_name is not None:
-                view_rec = self.get_view(view_name)
-                parent_view = view_rec
-            if zonename is not None or zonename != '':
-                zone_arr = zonename.split('.')
-                count = len(zone_arr)
-                for i in reversed(zone_arr):
-                    if count != 0:
-                        zone = self.get_zone(i, view=parent_view)
-                        if zone is None:
-                            return None
-                        parent_view = zone
-                    if count == 1:
-                        return parent_view
-                    count -= 1
+                parent_view = self.get_view(view_name)
+            if parent_view is not None and zonename:
+                return self._resolve_zone_path(zonename, parent_view)
         return None
 
-    def _get_records_by_zone(self, zone=None, record_type=TYPE_ZONE):
+    def _get_records_by_zone(self, zone=None, record_type=TYPE_ZONE,
+                             page_size=DEFAULT_PAGE_SIZE):
         """Retrieve a list of Resource Records from Proteus
         
         :param zone: Zone
         :type zone: :py:class:`proteus.objects.apientity.Zone`
         :param record_type: Record type to retreive
         :type record_type: str (use constants from :py:mod:`proteus.api.constants`
+        :param page_size: Number of records fetched per getEntities call
+        :type page_size: int
         
         :returns: 
             - Depending on the input type it can return:
@@ -149,24 +268,86 @@ class DNS(object):
                 - :py:class:`proteus.objects.apientity.HINFORecord`
             
         """
-        if self._client.is_valid_connection():
-            if zone is not None:
-                records = self._client._get_entities(
-                    zone.id,
-                    record_type,
-                    0,
-                    9999999)
-                rec_list = []
-                try:
-                    for i in records.item:
-                        a = APIObject(TypeRecord=i, client=self._client)
-                        if a is not None:
-                            rec_list.append(a)
-                    return rec_list
-                except AttributeError:
-                    pass
+        try:
+            rec_list = list(
+                self.iter_zone_records(zone, record_type, page_size))
+        except Exception:
+            # never hand out a partial list
+            return None
+        if len(rec_list) > 0:
+            return rec_list
         return None
 
+    def iter_zone_records(self, zone=None, record_type=TYPE_ZONE,
+                          page_size=DEFAULT_PAGE_SIZE, stream=False):
+        """Iterate over the Resource Records of a zone, page by page
+
+        Records are yielded as soon as their page arrives, so huge zones
+        never have to be held in memory at once. With `stream` every record
+        is yielded as soon as it is received, so even the size of a page
+        doesn't matter.
+
+        :param zone: Zone
+        :type zone: :py:class:`proteus.objects.apientity.Zone`
+        :param record_type: Record type to retreive
+        :type record_type: str (use constants from :py:mod:`proteus.api.constants`
+        :param page_size: Number of records fetched per getEntities call
+        :type page_size: int
+        :param stream: Decode the records while the reply is received
+        :type stream: bool
+
+        :returns: generator of resource records, see :py:meth:`_get_records_by_zone`
+
+        :raises: Exception when a page can't be fetched
+        """
+        if self._client.is_valid_connection() and zone is not None:
+            for record in self._client.iter_entities(
+                    zone.id, record_type, page_size, stream):
+                yield record
+
+    def _get_records_by_types(self, zone, record_types,
+                              page_size=DEFAULT_PAGE_SIZE, workers=4):
+        """Retrieve the Resource Records of several types in parallel
+
+        Every worker logs in with its own session, unless the client has a
+        session pool which the workers can share. The results are merged in
+        the order of `record_types`.
+
+        :param zone: Zone
+        :type zone: :py:class:`proteus.objects.apientity.Zone`
+        :param record_types: Record types to retrieve
+        :type record_types: list of str
+        :param page_size: Number of records fetched per getEntities call
+        :type page_size: int
+        :param workers: Max. number of parallel sessions
+        :type workers: int
+
+        :returns: mixed list of resource records
+
+        See: [#private_method]_
+        """
+        if zone is None:
+            return []
+
+        def _fetch(session, record_type):
+            rec_list = []
+            for item in session._iter_entities(
+                    zone.id, record_type, page_size, strict=True):
+                record = APIObject(TypeRecord=item, client=self._client)
+                if record is not None:
+                    rec_list.append(record)
+            return rec_list
+
+        results, errors = self._client._run_parallel(
+            _fetch, record_types, workers)
+        if len(errors) > 0:
+            raise errors[min(errors)]
+        zone_list = []
+        for rec_list in results:
+            zone_list.extend(rec_list)
+        return zone_list
+
+    @traced
     def get_view(self, view_name):
         """
         Get the Proteus View
@@ -179,33 +360,55 @@ class DNS(object):
 
         """
         if self._client.is_valid_connection():
+            view = self._view_cache.get(view_name)
+            if view is not None:
+                return view
             view = self._client._get_entity_by_name(
                 self._client.Configuration.id,
                 view_name,
                 TYPE_VIEW)
-            return APIObject(TypeRecord=view, client=self._client)
+            view = APIObject(TypeRecord=view, client=self._client)
+            if view is not None:
+                self._view_cache.put(view_name, view)
+            return view
         return None
 
-    def get_views(self):
+    @traced
+    def get_views(self, page_size=DEFAULT_PAGE_SIZE):
         """
         Get a list of all Views in Proteus
 
+        :Parameters:
+            - `page_size` : int
+
         :return:
             - list of :py:class:`proteus.objects.apientity.View`
 
         """
         if self._client.is_valid_connection():
-            views = self._client._get_entities(
-                self._client.Configuration.id,
-                TYPE_VIEW,
-                0,
-                99999)
-            view_arr = []
-            for i in views.item:
-                view_arr.append(APIObject(TypeRecord=i, client=self._client))
-            return view_arr
+            try:
+                return list(self.iter_views(page_size))
+            except Exception:
+                return None
         return None
 
+    def iter_views(self, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterate over all Views in Proteus, page by page
+
+        :Parameters:
+            - `page_size` : int
+
+        :return:
+            - generator of :py:class:`proteus.objects.apientity.View`
+
+        """
+        if self._client.is_valid_connection():
+            for view in self._client.iter_entities(
+                    self._client.Configuration.id, TYPE_VIEW, page_size):
+                yield view
+
+    @traced
     def get_zone(self, zone_name=None, view=None, view_name=None):
         """
         Get a Zone Record from Proteus
@@ -238,6 +441,7 @@ class DNS(object):
                     return APIObject(TypeRecord=zone, client=self._client)
         return False
 
+    @traced
     def get_host_record(self, hostname, zonename, view=None, view_name=None):
         """Retrieve Host Record from Proteus
         
@@ -255,6 +459,7 @@ class DNS(object):
         return self._get_record(hostname, zonename, view, view_name,
                                 TYPE_HOSTRECORD)
 
+    @traced
     def get_mx_record(self, hostname, zonename, view=None, view_name=None):
         """Retrieve Mailexchanger Record from Proteus
         
@@ -272,6 +477,7 @@ class DNS(object):
         return self._get_record(hostname, zonename, view, view_name,
                                 TYPE_MXRECORD)
 
+    @traced
     def get_txt_record(self, hostname, zonename, view=None, view_name=None):
         """Retrieve TXT Record from Proteus
         
@@ -289,6 +495,7 @@ class DNS(object):
         return self._get_record(hostname, zonename, view, view_name,
                                 TYPE_TXTRECORD)
 
+    @traced
     def get_cname_record(self, hostname, zonename, view=None, view_name=None):
         """Retrieve CNAME Record from Proteus
         
@@ -306,6 +513,7 @@ class DNS(object):
         return self._get_record(hostname, zonename, view, view_name,
                                 TYPE_CNAMERECORD)
 
+    @traced
     def get_hinfo_record(self, hostname, zonename, view=None, view_name=None):
         """Retrieve HINFO Record from Proteus
         
@@ -323,6 +531,7 @@ class DNS(object):
         return self._get_record(hostname, zonename, view, view_name,
                                 TYPE_HINFORECORD)
 
+    @traced
     def get_srv_record(self, hostname, zonename, view=None, view_name=None):
         """Retrieve SRV Record from Proteus
         
@@ -340,8 +549,86 @@ class DNS(object):
         return self._get_record(hostname, zonename, view, view_name,
                                 TYPE_SRVRECORD)
 
+    @traced
+    def get_records(self, items, rec_type=TYPE_HOSTRECORD, view=None,
+                    view_name=None, workers=4):
+        """Retrieve many Resource Records at once
+
+        The items are grouped by zone, every distinct zone is resolved only
+        once and the records are fetched with up to `workers` parallel
+        calls. A failing item doesn't fail the whole batch, an item whose
+        zone doesn't exist fails with an error.
+
+        :param items: (hostname, zonename) pairs
+        :type items: list of tuple
+        :param rec_type: Record type to retrieve
+        :type rec_type: str [ should be one of :py:data:`proteus.api.constants.DNS_ALLTYPES` ]
+        :param view: View (can be None when view_name is not None)
+        :type view: :py:class:`proteus.objects.apientity.View`
+        :param view_name: Name of the View (can be None when view is not None)
+        :type view_name: str
+        :param workers: Max. number of parallel lookups
+        :type workers: int
+
+        :returns: tuple of two dicts keyed by the input pairs, the first
+            maps to the record (or None when it doesn't exist), the second
+            to the exception of the failed lookups
+
+        Example:
+            >>> records, errors = dns.get_records(
+                [('host1', 'domain.tld'), ('host2', 'sub.domain.tld')],
+                view_name='Internal')
+        """
+        records = {}
+        errors = {}
+        if not self._client.is_valid_connection():
+            return records, errors
+        parent_view = view
+        if view_name is not None:
+            parent_view = self.get_view(view_name)
+        zones = {}
+        lookups = []
+        for item in items:
+            hostname, zonename = item
+            key = zonename.lower()
+            if key not in zones:
+                try:
+                    if parent_view is None:
+                        raise Exception('Unknown view')
+                    zone = self._resolve_zone_path(
+                        zonename, parent_view, strict=True)
+                    if zone is None or zone is parent_view:
+                        raise Exception('Unknown zone %s' % zonename)
+                    zones[key] = zone
+                except Exception, e:
+                    zones[key] = e
+            if isinstance(zones[key], Exception):
+                errors[item] = zones[key]
+            else:
+                lookups.append((item, zones[key]))
+
+        def _fetch(client, lookup):
+            item, zone = lookup
+            record = client._get_entity_by_name(zone.id, item[0], rec_type)
+            if record is False:
+                raise Exception('getEntityByName failed for %s.%s' % item)
+            if record is None:
+                return None
+            return APIObject(TypeRecord=record, client=self._client)
+
+        results, failed = self._client._run_parallel(
+            _fetch, lookups, workers)
+        for index, lookup in enumerate(lookups):
+            if index in failed:
+                errors[lookup[0]] = failed[index]
+            else:
+                records[lookup[0]] = results[index]
+        return records, errors
+
+    @traced
     def get_zone_list(self, zonename, view=None, view_name=None,
-                      rec_type=DNS_ALLTYPES):
+                      rec_type=DNS_ALLTYPES, page_size=DEFAULT_PAGE_SIZE,
+                      workers=None):
         """Retrieves a list of resource records for a special zone from Proteus
         
         :param zonename: Name of the Zone i.e. 'subzone.domain.tld'
@@ -353,6 +640,11 @@ class DNS(object):
         :param rec_type: Type of Record to return
         :type rec_type: str (use one of the constants of 
             :py:mod:`proteus.api.constants` or use DNS_ALLTYPES)
+        :param page_size: Number of records fetched per getEntities call
+        :type page_size: int
+        :param workers: When rec_type is DNS_ALLTYPES, fetch the types in
+            parallel over up to this many additional sessions
+        :type workers: int
         
         :returns:
             - Depending on the input type it can return:
@@ -363,24 +655,30 @@ class DNS(object):
                 - :py:class:`proteus.objects.apientity.HINFORecord`
             - or when rec_type is DNS_ALLTYPES:
                 - return a mixed list of all types above 
+            - None when a getEntities call fails, never a partial list
         """
         if self._client.is_valid_connection():
             zone = self._find_zone(zonename, view, view_name)
             if rec_type in DNS_ALLTYPES:
-                rec_list = []
                 rec_list = self._get_records_by_zone(
                     zone,
-                    rec_type)
+                    rec_type,
+                    page_size)
                 if rec_list is not None:
                     return rec_list
             elif rec_type == DNS_ALLTYPES:
-                zone_list = []
-                for i in DNS_ALLTYPES:
-                    rec_list = []
-                    rec_list = self._get_records_by_zone(zone, i)
-                    if rec_list is not None:
-                        zone_list.extend(rec_list)
-                return zone_list
+                try:
+                    if workers is not None and workers > 1:
+                        return self._get_records_by_types(
+                            zone, DNS_ALLTYPES, page_size, workers)
+                    zone_list = []
+                    for i in DNS_ALLTYPES:
+                        zone_list.extend(
+                            self.iter_zone_records(zone, i, page_size))
+                    return zone_list
+                except Exception:
+                    # a failed type would leave the list incomplete
+                    return None
         return None
 
 
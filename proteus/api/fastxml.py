@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Decoding of raw getEntities and getEntityByName replies
+
+suds builds a sudsobject tree for every reply which
+:py:class:`proteus.objects.apientity.APIObject` then converts into a dict
+again. With the fast decode path the raw reply is parsed with cElementTree
+straight into those dicts.
+"""
+
+from cStringIO import StringIO
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+
+_FIELDS = ('id', 'name', 'type', 'properties')
+
+
+class RawEntity(dict):
+    """
+    Decoded APIEntity
+
+    A dict with the keys id, name, type and properties, which is what
+    :py:class:`proteus.objects.apientity.APIObject` builds the records
+    from. The keys are also readable as attributes, like the ones of the
+    suds APIEntity, fields missing in the reply read as None. Other names
+    raise AttributeError, so copy, pickle and hasattr work as usual.
+    """
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        if name not in _FIELDS:
+            raise AttributeError(name)
+        return self.get(name)
+
+
+class RawEntityArray(object):
+    """
+    Decoded APIEntityArray, the entities are in `item`
+    """
+    __slots__ = ('item', )
+
+    def __init__(self, item):
+        self.item = item
+
+
+def _local_name(tag):
+    return tag.rpartition('}')[2]
+
+
+def iter_entities(reply, entity_tag):
+    """
+    Parse a SOAP reply and yield every `entity_tag` element as
+    :py:class:`RawEntity`
+
+    Decoded elements are detached from the tree, so with a file-like
+    `reply` which is read while parsing the memory use doesn't grow with
+    the number of entities.
+
+    :Parameters:
+        - `reply` : string or file-like object [ raw SOAP reply ]
+        - `entity_tag` : string [ 'item' or 'return' ]
+    """
+    source = reply
+    if isinstance(reply, basestring):
+        source = StringIO(reply)
+    entity = RawEntity()
+    parents = []
+    for event, element in ElementTree.iterparse(source, ('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        tag = _local_name(element.tag)
+        if tag in _FIELDS:
+            entity[tag] = element.text
+        elif tag == entity_tag:
+            if 'id' in entity:
+                entity['id'] = long(entity['id'])
+                yield entity
+            entity = RawEntity()
+            element.clear()
+            if len(parents) > 0:
+                parents[-1].remove(element)
+
+
+def decode_entity(reply):
+    """
+    Decode a getEntityByName reply
+
+    :return:
+        :py:class:`RawEntity`, with id 0 when the entity doesn't exist
+    """
+    for entity in iter_entities(reply, 'return'):
+        return entity
+    return RawEntity(id=0L)
+
+
+def decode_entity_array(reply):
+    """
+    Decode a getEntities reply
+
+    :return:
+        :py:class:`RawEntityArray`
+    """
+    return RawEntityArray(list(iter_entities(reply, 'item')))
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+""" Per-call instrumentation of the SOAP operations """
+
+import time
+import threading
+
+from suds.plugin import MessagePlugin
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+MAX_ARGUMENT_LENGTH = 200
+
+
+class CallRecord(object):
+    """
+    Measurements of a single SOAP call, passed to
+    :py:meth:`Instrument.after_call`
+
+    :Attributes:
+        - `operation` : string [ SOAP operation, i.e. 'getEntityByName' ]
+        - `arguments` : string [ shortened argument list ]
+        - `started` : float [ unix timestamp ]
+        - `duration` : float [ seconds ]
+        - `size` : int [ bytes of the reply, None if unknown ]
+        - `count` : int [ number of returned entities, None if unknown ]
+        - `error` : Exception [ None if the call succeeded ]
+    """
+    __slots__ = ('operation', 'arguments', 'started', 'duration', 'size',
+                 'count', 'error')
+
+    def __init__(self, operation, arguments, started):
+        self.operation = operation
+        self.arguments = arguments
+        self.started = started
+        self.duration = None
+        self.size = None
+        self.count = None
+        self.error = None
+
+
+class Instrument(object):
+    """
+    Base class for instrumentation sinks
+
+    Both hooks are called in the thread issuing the SOAP call and must not
+    raise.
+    """
+    def before_call(self, operation, arguments):
+        """
+        Called before a SOAP call is sent
+        """
+        pass
+
+    def after_call(self, record):
+        """
+        Called with the :py:class:`CallRecord` of a finished SOAP call
+        """
+        pass
+
+
+class CallbackInstrument(Instrument):
+    """
+    Instrument calling plain functions
+
+    Example:
+        >>> pc=ProteusClient(..., instruments=[
+                CallbackInstrument(after=lambda r: log.info(r.operation))])
+    """
+    def __init__(self, before=None, after=None):
+        self._before = before
+        self._after = after
+
+    def before_call(self, operation, arguments):
+        if self._before is not None:
+            self._before(operation, arguments)
+
+    def after_call(self, record):
+        if self._after is not None:
+            self._after(record)
+
+
+class OperationStats(object):
+    """
+    Aggregated measurements of one SOAP operation
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histogram = [0] * (len(buckets) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.results = 0
+        self.bytes = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def add(self, record):
+        self.calls += 1
+        if record.error is not None:
+            self.errors += 1
+        if record.count is not None:
+            self.results += record.count
+        if record.size is not None:
+            self.bytes += record.size
+        self.total_time += record.duration
+        self.max_time = max(self.max_time, record.duration)
+        position = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if record.duration <= bound:
+                position = i
+                break
+        self.histogram[position] += 1
+
+    def copy(self):
+        stats = OperationStats(self.buckets)
+        stats.histogram = list(self.histogram)
+        stats.calls = self.calls
+        stats.errors = self.errors
+        stats.results = self.results
+        stats.bytes = self.bytes
+        stats.total_time = self.total_time
+        stats.max_time = self.max_time
+        return stats
+
+    def _get_mean(self):
+        if self.calls == 0:
+            return None
+        return self.total_time / self.calls
+    mean = property(_get_mean, doc='Mean latency in seconds')
+
+    def percentile(self, percent):
+        """
+        Estimate a latency percentile from the histogram
+
+        :Parameters:
+            - `percent` : float [ i.e. 99 ]
+
+        :return:
+            upper bound of the bucket holding the percentile in seconds,
+            the max. latency for the last bucket
+        """
+        if self.calls == 0:
+            return None
+        rank = self.calls * percent / 100.0
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if count > 0 and seen >= rank:
+                if i < len(self.buckets):
+                    return min(self.buckets[i], self.max_time)
+                break
+        return self.max_time
+
+
+class MetricsAggregator(Instrument):
+    """
+    In-process aggregation of call counters and latency histograms,
+    per SOAP operation
+
+    Example:
+        >>> from proteus.api.instrumentation import MetricsAggregator
+        >>> metrics=MetricsAggregator()
+        >>> pc=ProteusClient(..., instruments=[metrics])
+        >>> ...
+        >>> metrics.stats('getEntityByName').percentile(99)
+        >>> print metrics.report()
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :Parameters:
+            - `buckets` : tuple of float [ histogram bucket upper bounds in seconds ]
+        """
+        self._buckets = tuple(buckets)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def after_call(self, record):
+        with self._lock:
+            stats = self._stats.get(record.operation)
+            if stats is None:
+                stats = OperationStats(self._buckets)
+                self._stats[record.operation] = stats
+            stats.add(record)
+
+    def stats(self, operation=None):
+        """
+        Get a copy of the aggregated measurements
+
+        :Parameters:
+            - `operation` : string [ optional ]
+
+        :return:
+            :py:class:`OperationStats` of `operation` (None if it was never
+            called) or a dict of all of them, keyed by operation
+        """
+        with self._lock:
+            if operation is not None:
+                stats = self._stats.get(operation)
+                if stats is None:
+                    return None
+                return stats.copy()
+            return dict((name, stats.copy())
+                        for name, stats in self._stats.items())
+
+    def reset(self):
+        """
+        Drop all measurements
+        """
+        with self._lock:
+            self._stats = {}
+
+    def report(self):
+        """
+        Format the measurements as a text table
+        """
+        lines = ['%-20s %8s %7s %9s %11s %9s %9s %9s' % (
+            'operation', 'calls', 'errors', 'results', 'bytes', 'mean ms',
+            'p99 ms', 'max ms')]
+        for name, stats in sorted(self.stats().items()):
+            lines.append('%-20s %8d %7d %9d %11d %9.1f %9.1f %9.1f' % (
+                name, stats.calls, stats.errors, stats.results, stats.bytes,
+                stats.mean * 1000, stats.percentile(99) * 1000,
+                stats.max_time * 1000))
+        return '\n'.join(lines)
+
+
+class ReplySizePlugin(MessagePlugin):
+    """
+    suds plugin remembering the size of the last received reply
+
+    suds copies the plugins of a Client into its clones, so every pooled
+    session gets its own instance.
+    """
+    def __init__(self):
+        self.size = None
+
+    def received(self, context):
+        self.size = len(context.reply)
+
+
+def reply_plugin(client):
+    for plugin in client.options.plugins:
+        if isinstance(plugin, ReplySizePlugin):
+            return plugin
+    return None
+
+
+def _result_count(result):
+    if result is None:
+        return 0
+    items = getattr(result, 'item', None)
+    if items is not None:
+        return len(items)
+    if not getattr(result, 'id', None):
+        # empty APIEntityArray, or the empty APIEntity getEntityByName
+        # returns for missing entities
+        return 0
+    return 1
+
+
+def _summarize(arg):
+    if hasattr(arg, 'id') and hasattr(arg, 'type'):
+        # APIObject, its repr lists all members
+        return '<%s %s>' % (arg.type, arg.id)
+    return repr(arg)
+
+
+def summarize_arguments(args):
+    """
+    Shorten a SOAP argument list for recording
+    """
+    summary = ', '.join(_summarize(arg) for arg in args)
+    if len(summary) > MAX_ARGUMENT_LENGTH:
+        summary = summary[:MAX_ARGUMENT_LENGTH - 3] + '...'
+    return summary
+
+
+def instrumented_call(instruments, operation, arguments, func, *args,
+                      **kwargs):
+    """
+    Run func(*args, **kwargs) and report it to all `instruments`
+
+    :Parameters:
+        - `instruments` : sequence of :py:class:`Instrument`
+        - `operation` : string
+        - `arguments` : string [ see :py:func:`summarize_arguments` ]
+        - `func` : callable
+
+    The keyword argument `client` is not passed on, it names the suds
+    Client whose reply size is recorded.
+    """
+    plugin = None
+    client = kwargs.pop('client', None)
+    if client is not None:
+        plugin = reply_plugin(client)
+        if plugin is not None:
+            plugin.size = None
+    for instrument in instruments:
+        instrument.before_call(operation, arguments)
+    record = CallRecord(operation, arguments, time.time())
+    try:
+        result = func(*args, **kwargs)
+        if client is not None:
+            record.count = _result_count(result)
+        return result
+    except Exception, e:
+        record.error = e
+        raise
+    finally:
+        record.duration = time.time() - record.started
+        if plugin is not None:
+            record.size = plugin.size
+        for instrument in instruments:
+            instrument.after_call(record)
+
+
+def instrumented_iter(instruments, operation, arguments, iterable,
+                      size=None):
+    """
+    Yield from `iterable` and report it to all `instruments` as one call,
+    which lasts until the iterable is exhausted
+
+    :Parameters:
+        - `instruments` : sequence of :py:class:`Instrument`
+        - `operation` : string
+        - `arguments` : string [ see :py:func:`summarize_arguments` ]
+        - `iterable` : iterable
+        - `size` : callable [ optional, returns the reply size once done ]
+    """
+    for instrument in instruments:
+        instrument.before_call(operation, arguments)
+    record = CallRecord(operation, arguments, time.time())
+    record.count = 0
+    try:
+        for item in iterable:
+            record.count += 1
+            yield item
+    except Exception, e:
+        record.error = e
+        raise
+    finally:
+        record.duration = time.time() - record.started
+        if size is not None:
+            record.size = size()
+        for instrument in instruments:
+            instrument.after_call(record)
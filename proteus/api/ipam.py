@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+import bisect
+import socket
+
+from constants import *
+from iputils import parse_network, parse_range
+from proteus.objects import *
+
+
+def _block_range(block):
+    """
+    Address range of an IP4Block, from its CIDR or start/end properties
+
+    :return:
+        tuple of ( ip version, first address, last address ) or None, also
+        for malformed addresses
+    """
+    properties = block.properties
+    if properties is None:
+        return None
+    try:
+        return parse_network(properties.CIDR)
+    except AttributeError:
+        pass
+    except (ValueError, socket.error):
+        return None
+    try:
+        return parse_range(properties.start, properties.end)
+    except (AttributeError, ValueError, socket.error):
+        return None
+
+
+class BlockTree(object):
+    """
+    Containment structure over the IP4Block hierarchy of a configuration
+
+    Blocks nest into each other and siblings don't overlap, so every level
+    keeps its blocks sorted by first address and a lookup descends from the
+    top level with one binary search per level.
+
+    Blocks without a valid range can't be placed, their ids are listed in
+    `skipped` and the blocks below them aren't loaded.
+    """
+    def __init__(self):
+        self.skipped = []
+        self._blocks = {}
+        self._ranges = {}
+        self._children = {None: []}
+        self._starts = {}
+
+    def _add(self, block, parent_id=None):
+        block_range = _block_range(block)
+        if block_range is None:
+            self.skipped.append(block.id)
+            return False
+        self._blocks[block.id] = block
+        self._ranges[block.id] = block_range
+        self._children.setdefault(parent_id, []).append(block.id)
+        self._children.setdefault(block.id, [])
+        return True
+
+    def _finish(self):
+        """
+        Sort every level by address
+        """
+        for parent_id, children in self._children.items():
+            children.sort(key=lambda block_id: self._ranges[block_id])
+            self._starts[parent_id] = [
+                self._ranges[block_id][:2] for block_id in children]
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def get(self, block_id):
+        """
+        Get a block by its id
+        """
+        return self._blocks.get(block_id)
+
+    def children(self, block=None):
+        """
+        List the direct children of a block
+
+        :Parameters:
+            - `block` : :py:class:`proteus.objects.apientity.IP4Block` or its id [ None lists the top level blocks ]
+
+        :return:
+            list of :py:class:`proteus.objects.apientity.IP4Block`, ordered by address
+        """
+        block_id = getattr(block, 'id', block)
+        return [self._blocks[i] for i in self._children.get(block_id, [])]
+
+    def path(self, network):
+        """
+        List all blocks containing an address or network, outermost first
+
+        :Parameters:
+            - `network` : string [ i.e. '10.1.2.3' or '10.1.2.0/24' ]
+
+        :return:
+            list of :py:class:`proteus.objects.apientity.IP4Block`
+        """
+        version, first, last = parse_network(network)
+        result = []
+        parent_id = None
+        while True:
+            children = self._children.get(parent_id, [])
+            position = bisect.bisect_right(
+                self._starts.get(parent_id, []), (version, first)) - 1
+            if position < 0:
+                return result
+            block_id = children[position]
+            block_version, block_first, block_last = self._ranges[block_id]
+            if block_version != version \
+                or block_first > first or block_last < last:
+                return result
+            result.append(self._blocks[block_id])
+            parent_id = block_id
+
+    def find(self, network):
+        """
+        Find the smallest block containing an address or network
+
+        :Parameters:
+            - `network` : string [ i.e. '10.1.2.3' or '10.1.2.0/24' ]
+
+        :return:
+            :py:class:`proteus.objects.apientity.IP4Block` or None
+        """
+        path = self.path(network)
+        if len(path) > 0:
+            return path[-1]
+        return None
+
+
+class IPAM(object):
+    """Proteus IP Address Management Class"""
+
+    def __init__(self, proteus_client=None):
+        """
+        :Parameters:
+            - `proteus_client` : instance of :py:class:`proteus.api.client.ProteusClient`
+
+        """
+        self._client = proteus_client
+
+    def iter_blocks(self, parent=None, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Iterate over the IP4Blocks directly below a parent, page by page
+
+        :Parameters:
+            - `parent` : :py:class:`proteus.objects.apientity.IP4Block` [ None uses the Configuration ]
+            - `page_size` : int
+
+        :return:
+            - generator of :py:class:`proteus.objects.apientity.IP4Block`
+
+        :raise:
+            Exception when a page can't be fetched
+        """
+        if self._client.is_valid_connection():
+            if parent is None:
+                parent = self._client.Configuration
+            for block in self._client.iter_entities(
+                    parent.id, TYPE_IP4BLOCK, page_size):
+                yield block
+
+    def get_blocks(self, parent=None, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Get a list of the IP4Blocks directly below a parent
+
+        :Parameters:
+            - `parent` : :py:class:`proteus.objects.apientity.IP4Block` [ None uses the Configuration ]
+            - `page_size` : int
+
+        :return:
+            - list of :py:class:`proteus.objects.apientity.IP4Block`
+            - None when a getEntities call fails, never a partial list
+        """
+        if self._client.is_valid_connection():
+            try:
+                return list(self.iter_blocks(parent, page_size))
+            except Exception:
+                # never hand out a partial list
+                return None
+        return None
+
+    def load_block_tree(self, configuration=None, page_size=DEFAULT_PAGE_SIZE,
+                        workers=None):
+        """
+        Load the whole IP4Block hierarchy of a configuration
+
+        The hierarchy is fetched level by level, with `workers` the children
+        of all blocks of a level are fetched in parallel. The worker sessions
+        are opened once for the whole load. Blocks without a valid range are
+        skipped together with the blocks below them, see
+        :py:attr:`BlockTree.skipped`.
+
+        :Parameters:
+            - `configuration` : :py:class:`proteus.objects.apientity.Configuration` [ None uses the client's Configuration ]
+            - `page_size` : int
+            - `workers` : int [ optional, max. number of parallel sessions ]
+
+        :return:
+            - :py:class:`BlockTree`
+
+        Example:
+            >>> tree=pc.IPAM.load_block_tree(workers=4)
+            >>> tree.find('10.1.2.3')
+            >>> tree.children(block)
+        """
+        tree = BlockTree()
+        if not self._client.is_valid_connection():
+            return tree
+        if configuration is None:
+            configuration = self._client.Configuration
+
+        def _fetch(client, parent_id):
+            blocks = []
+            for item in client._iter_entities(
+                    parent_id, TYPE_IP4BLOCK, page_size, strict=True):
+                block = APIObject(TypeRecord=item, client=self._client)
+                if block is not None:
+                    blocks.append(block)
+            return blocks
+
+        level = [configuration.id]
+        with self._client._worker_sessions(workers or 1) as sessions:
+            while len(level) > 0:
+                if workers is not None and workers > 1:
+                    results, errors = self._client._run_parallel(
+                        _fetch, level, workers, sessions)
+                    if len(errors) > 0:
+                        raise errors[min(errors)]
+                else:
+                    results = [_fetch(self._client, i) for i in level]
+                next_level = []
+                for parent_id, blocks in zip(level, results):
+                    if parent_id == configuration.id:
+                        parent_id = None
+                    for block in blocks:
+                        # the children of a skipped block would end up
+                        # in a tree whose parent doesn't exist
+                        if tree._add(block, parent_id):
+                            next_level.append(block.id)
+                level = next_level
+        tree._finish()
+        return tree
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+import bisect
+import socket
+
+from constants import *
+from iputils import parse_address, parse_network
+
+
+def _record_addresses(record):
+    """
+    Parse the comma separated `addresses` property of a HostRecord
+    """
+    if record.properties is None:
+        return ()
+    try:
+        addresses = record.properties.addresses
+    except AttributeError:
+        return ()
+    keys = []
+    for address in addresses.split(','):
+        if not address.strip():
+            continue
+        try:
+            keys.append(parse_address(address))
+        except (socket.error, ValueError):
+            continue
+    return tuple(keys)
+
+
+class HostAddressIndex(object):
+    """
+    Reverse index from IP address to HostRecord
+
+    The addresses of all indexed records are kept in one sorted list, exact
+    and CIDR queries are binary searches. Records can be added and removed
+    one by one as they change, or in bulk from a stream of zone pages.
+
+    Adding or removing a single record finds its entries in O(log n), but
+    inserting into and deleting from the list shifts the entries behind
+    them, which is O(n). The shift is a memmove of pointers, a fraction of
+    a millisecond even for a million entries, so it is cheap enough for
+    records changing one by one. Large batches should go through
+    :py:meth:`add_records`, which sorts once in O(n log n).
+
+    Example:
+        >>> from proteus.api.ipindex import HostAddressIndex
+        >>> index=HostAddressIndex()
+        >>> index.add_records(pc.DNS.iter_zone_records(zone, TYPE_HOSTRECORD))
+        >>> index.lookup('10.1.2.3')
+        >>> index.lookup_network('10.1.2.0/24')
+    """
+    def __init__(self):
+        self._entries = []
+        self._records = {}
+        self._addresses = {}
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, record):
+        """
+        Index a HostRecord, replacing an already indexed version of it
+
+        O(n) per address of the record, see the class description.
+
+        :Parameters:
+            - `record` : :py:class:`proteus.objects.apientity.HostRecord`
+        """
+        if record.id in self._records:
+            self.remove(record.id)
+        keys = _record_addresses(record)
+        self._records[record.id] = record
+        self._addresses[record.id] = keys
+        for key in keys:
+            bisect.insort(self._entries, (key, record.id))
+
+    def add_records(self, records):
+        """
+        Index a stream of HostRecords, i.e. from
+        :py:meth:`proteus.api.dns.DNS.iter_zone_records`
+
+        The entries of replaced records are dropped in one pass and the
+        list is sorted once at the end instead of per record.
+
+        :Parameters:
+            - `records` : iterable of :py:class:`proteus.objects.apientity.HostRecord`
+
+        :return:
+            number of indexed records
+        """
+        count = 0
+        replaced = set()
+        added = {}
+        for record in records:
+            if record.type != TYPE_HOSTRECORD:
+                continue
+            if record.id in self._records and record.id not in added:
+                replaced.add(record.id)
+            keys = _record_addresses(record)
+            self._records[record.id] = record
+            self._addresses[record.id] = keys
+            added[record.id] = keys
+            count += 1
+        if len(replaced) > 0:
+            self._entries = [entry for entry in self._entries
+                             if entry[1] not in replaced]
+        for record_id, keys in added.iteritems():
+            for key in keys:
+                self._entries.append((key, record_id))
+        self._entries.sort()
+        return count
+
+    def remove(self, record):
+        """
+        Drop a HostRecord from the index
+
+        O(n) per address of the record, see the class description.
+
+        :Parameters:
+            - `record` : :py:class:`proteus.objects.apientity.HostRecord` or its id
+        """
+        record_id = getattr(record, 'id', record)
+        if record_id not in self._records:
+            return
+        for key in self._addresses.pop(record_id):
+            position = bisect.bisect_left(self._entries, (key, record_id))
+            if position < len(self._entries) \
+                and self._entries[position] == (key, record_id):
+                del self._entries[position]
+        del self._records[record_id]
+
+    def _collect(self, low, high, reverse_only):
+        result = []
+        seen = set()
+        start = bisect.bisect_left(self._entries, (low, ))
+        for position in xrange(start, len(self._entries)):
+            key, record_id = self._entries[position]
+            if key > high:
+                break
+            if record_id in seen:
+                continue
+            seen.add(record_id)
+            record = self._records[record_id]
+            if reverse_only:
+                try:
+                    if record.properties.reverseRecord != 'true':
+                        continue
+                except AttributeError:
+                    continue
+            result.append(record)
+        return result
+
+    def lookup(self, address, reverse_only=False):
+        """
+        Find the HostRecords pointing at an address
+
+        :Parameters:
+            - `address` : string [ i.e. '10.1.2.3' ]
+            - `reverse_only` : bool [ only records with reverseRecord=true ]
+
+        :return:
+            list of :py:class:`proteus.objects.apientity.HostRecord`
+        """
+        key = parse_address(address)
+        return self._collect(key, key, reverse_only)
+
+    def lookup_network(self, network, reverse_only=False):
+        """
+        Find the HostRecords with an address inside a network
+
+        :Parameters:
+            - `network` : string [ i.e. '10.1.2.0/24' ]
+            - `reverse_only` : bool [ only records with reverseRecord=true ]
+
+        :return:
+            list of :py:class:`proteus.objects.apientity.HostRecord`, ordered by address
+        """
+        version, first, last = parse_network(network)
+        return self._collect((version, first), (version, last), reverse_only)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+""" IP address helpers """
+
+import socket
+
+
+def parse_address(address):
+    """
+    Convert an IPv4 or IPv6 address into a comparable key
+
+    :Parameters:
+        - `address` : string
+
+    :return:
+        tuple of ( ip version, address as integer )
+    """
+    address = address.strip()
+    if ':' in address:
+        packed = socket.inet_pton(socket.AF_INET6, address)
+        version = 6
+    else:
+        packed = socket.inet_pton(socket.AF_INET, address)
+        version = 4
+    return version, int(packed.encode('hex'), 16)
+
+
+def format_address(version, value):
+    """
+    Convert a key returned by :py:func:`parse_address` back into a string
+    """
+    if version == 6:
+        packed = ('%032x' % value).decode('hex')
+        return socket.inet_ntop(socket.AF_INET6, packed)
+    packed = ('%08x' % value).decode('hex')
+    return socket.inet_ntop(socket.AF_INET, packed)
+
+
+def parse_network(network):
+    """
+    Convert a CIDR network or a single address into an address range
+
+    :Parameters:
+        - `network` : string [ i.e. '10.1.0.0/16' or '10.1.2.3' ]
+
+    :return:
+        tuple of ( ip version, first address, last address )
+    """
+    address, sep, prefix = network.strip().partition('/')
+    version, value = parse_address(address)
+    bits = 32
+    if version == 6:
+        bits = 128
+    if sep:
+        prefix = int(prefix)
+        if prefix < 0 or prefix > bits:
+            raise ValueError('Invalid prefix length in %s' % network)
+    else:
+        prefix = bits
+    host_mask = (1 << (bits - prefix)) - 1
+    first = value & ~host_mask
+    return version, first, first | host_mask
+
+
+def parse_range(first, last):
+    """
+    Convert a start and an end address into an address range
+
+    :return:
+        tuple of ( ip version, first address, last address )
+    """
+    version, first_value = parse_address(first)
+    last_version, last_value = parse_address(last)
+    if version != last_version or last_value < first_value:
+        raise ValueError('Invalid address range %s - %s' % (first, last))
+    return version, first_value, last_value
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no session could be checked out in time"""
+    pass
+
+
+class SessionPool(object):
+    """
+    Thread safe pool of authenticated sessions
+
+    Sessions are created on demand up to `max_size`. Idle sessions above
+    `min_size` are closed after `idle_timeout` seconds, and a session which
+    has been idle for longer than `health_check_interval` seconds is checked
+    before it is handed out again.
+    """
+    def __init__(
+        self,
+        factory,
+        close=None,
+        min_size=1,
+        max_size=4,
+        checkout_timeout=30,
+        idle_timeout=300,
+        health_check=None,
+        health_check_interval=60):
+        """
+        :Parameters:
+            - `factory` : callable [ returns a new, logged in session ]
+            - `close` : callable [ optional, logs out a session ]
+            - `min_size` : int [ sessions kept open even when idle ]
+            - `max_size` : int [ max. number of open sessions ]
+            - `checkout_timeout` : int [ seconds to wait for a free session ]
+            - `idle_timeout` : int [ seconds until an idle session is closed ]
+            - `health_check` : callable [ optional, returns False for broken sessions ]
+            - `health_check_interval` : int [ seconds ]
+        """
+        self._factory = factory
+        self._close = close
+        self._min_size = min_size
+        self._max_size = max(max_size, 1)
+        self._checkout_timeout = checkout_timeout
+        self._idle_timeout = idle_timeout
+        self._health_check = health_check
+        self._health_check_interval = health_check_interval
+        self._idle = []
+        self._size = 0
+        self._closed = False
+        self._lock = threading.Condition()
+
+    def fill(self):
+        """
+        Open sessions until `min_size` sessions exist
+        """
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self._min_size:
+                    return
+                self._size += 1
+            try:
+                session = self._factory()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                raise
+            self.checkin(session)
+
+    def _destroy(self, session):
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+        if self._close is not None:
+            try:
+                self._close(session)
+            except Exception:
+                pass
+
+    def _evict_idle(self, now):
+        """
+        Take idle sessions above `min_size` out of the pool, caller holds the lock
+        """
+        evicted = []
+        if self._idle_timeout is None:
+            return evicted
+        keep = []
+        # _idle is ordered oldest first, so the oldest sessions go first
+        for entry in self._idle:
+            if now - entry[1] > self._idle_timeout \
+                and self._size - len(evicted) > self._min_size:
+                evicted.append(entry[0])
+            else:
+                keep.append(entry)
+        self._idle = keep
+        return evicted
+
+    def checkout(self, timeout=None):
+        """
+        Get a session from the pool
+
+        :Parameters:
+            - `timeout` : int [ seconds, defaults to `checkout_timeout` ]
+
+        :return:
+            session
+        """
+        if timeout is None:
+            timeout = self._checkout_timeout
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while True:
+            session = None
+            create = False
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise Exception('Session pool is closed')
+                    now = time.time()
+                    evicted = self._evict_idle(now)
+                    if len(evicted) > 0:
+                        break
+                    if len(self._idle) > 0:
+                        session, last_used = self._idle.pop()
+                        break
+                    if self._size < self._max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise PoolTimeout(
+                                'No session available after %ss' % timeout)
+                        self._lock.wait(remaining)
+                    else:
+                        self._lock.wait()
+            if session is None and not create:
+                for old in evicted:
+                    self._destroy(old)
+                continue
+            if create:
+                try:
+                    return self._factory()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            if self._health_check is not None \
+                and now - last_used > self._health_check_interval:
+                try:
+                    healthy = self._health_check(session)
+                except Exception:
+                    healthy = False
+                if not healthy:
+                    self._destroy(session)
+                    continue
+            return session
+
+    def checkin(self, session, discard=False):
+        """
+        Return a session to the pool
+
+        :Parameters:
+            - `session` : session returned by :py:meth:`checkout`
+            - `discard` : bool [ close the session instead of reusing it ]
+        """
+        if discard or self._closed:
+            self._destroy(session)
+            return
+        now = time.time()
+        with self._lock:
+            self._idle.append((session, now))
+            self._lock.notify()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        Context manager which checks a session out and in again
+
+        A session is discarded when the block raises an exception. A
+        generator holding the session which is closed early gives it back
+        for reuse.
+
+        Example:
+            >>> with pool.session() as client:
+            ...     client.service.getEntities(...)
+        """
+        session = self.checkout(timeout)
+        discard = False
+        try:
+            yield session
+        except GeneratorExit:
+            raise
+        except BaseException:
+            # i.e. interrupted in the middle of a call
+            discard = True
+            raise
+        finally:
+            self.checkin(session, discard=discard)
+
+    def close(self):
+        """
+        Close all idle sessions, sessions in use are closed on checkin
+        """
+        with self._lock:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle = []
+        for session in idle:
+            self._destroy(session)
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Local, read-only zone snapshots
+
+A snapshot file has three parts:
+
+    - header: magic, format version, record count, offset of the index
+    - records: id, fqdn, type, name and property string of every entity
+    - index: record offsets, sorted by (fqdn, type)
+
+The file is memory mapped by :py:class:`ZoneSnapshot`, lookups binary
+search the index without loading the records, and all processes reading
+the same snapshot share its pages.
+"""
+
+import os
+import mmap
+import struct
+import tempfile
+
+from constants import *
+from proteus.objects import *
+
+
+SNAPSHOT_MAGIC = 'PRSNAP'
+SNAPSHOT_VERSION = 1
+
+_HEADER = struct.Struct('<6sHIQ')
+_RECORD = struct.Struct('<qHHHI')
+_OFFSET = struct.Struct('<Q')
+
+
+def _encode(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _record_fqdn(record, zone_fqdn):
+    properties = record.properties
+    if properties is not None:
+        try:
+            return properties.absoluteName.lower()
+        except AttributeError:
+            pass
+    if zone_fqdn:
+        return ('%s.%s' % (record.name, zone_fqdn)).lower()
+    return (record.name or '').lower()
+
+
+def export_snapshot(dns, path, zonename=None, view=None, view_name=None,
+                    record_types=DNS_ALLTYPES, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Dump a view or a zone tree into a snapshot file
+
+    Zones are walked recursively, every zone and every record of
+    `record_types` below it is written. The file is written to a temporary
+    name first and renamed, readers never see a partial snapshot.
+
+    :Parameters:
+        - `dns` : :py:class:`proteus.api.dns.DNS`
+        - `path` : string
+        - `zonename` : string [ optional, i.e. 'subzone.domain.tld', None dumps the whole view ]
+        - `view` : :py:class:`proteus.objects.apientity.View`
+        - `view_name` : string
+        - `record_types` : list of record types
+        - `page_size` : int
+
+    :return:
+        number of entities written
+
+    :raise:
+        Exception when a page can't be fetched, an existing snapshot at
+        `path` is then left untouched
+
+    Example:
+        >>> from proteus.api.snapshot import export_snapshot
+        >>> export_snapshot(pc.DNS, '/var/lib/proteus/internal.snap',
+                view_name='Internal')
+    """
+    if view is None and view_name is not None:
+        view = dns.get_view(view_name)
+    if view is None:
+        raise Exception('Unknown view')
+    zone = None
+    if zonename:
+        zone = dns._find_zone(zonename, view)
+        if zone is None:
+            raise Exception('Unknown zone %s' % zonename)
+    record_types = [t for t in record_types if t != TYPE_ZONE]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    f = os.fdopen(fd, 'wb')
+    try:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, 0))
+        index = []
+
+        def _write(record, fqdn):
+            fqdn = _encode(fqdn)
+            entity_type = _encode(record.type)
+            name = _encode(record.name)
+            properties = ''
+            if record.properties is not None:
+                properties = _encode(record.properties._property_string)
+            index.append((fqdn, entity_type, f.tell()))
+            f.write(_RECORD.pack(record.id, len(fqdn), len(entity_type),
+                                 len(name), len(properties)))
+            f.write(fqdn)
+            f.write(entity_type)
+            f.write(name)
+            f.write(properties)
+
+        if zone is not None:
+            _write(zone, zonename.lower())
+            pending = [(zone, zonename.lower())]
+        else:
+            # the view is the parent of the top level zones
+            pending = [(view, '')]
+        while len(pending) > 0:
+            parent, parent_fqdn = pending.pop()
+            for subzone in dns.iter_zone_records(parent, TYPE_ZONE, page_size):
+                fqdn = _record_fqdn(subzone, parent_fqdn)
+                _write(subzone, fqdn)
+                pending.append((subzone, fqdn))
+            if parent is view:
+                continue
+            for record_type in record_types:
+                for record in dns.iter_zone_records(
+                        parent, record_type, page_size):
+                    _write(record, _record_fqdn(record, parent_fqdn))
+
+        index.sort()
+        index_offset = f.tell()
+        for entry in index:
+            f.write(_OFFSET.pack(entry[2]))
+        f.seek(0)
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(index),
+                             index_offset))
+        f.close()
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, path)
+    except Exception:
+        f.close()
+        os.remove(tmp_path)
+        raise
+    return len(index)
+
+
+class ZoneSnapshot(object):
+    """
+    Memory mapped, read-only view of a snapshot file
+
+    Example:
+        >>> from proteus.api.snapshot import ZoneSnapshot
+        >>> snap=ZoneSnapshot('/var/lib/proteus/internal.snap')
+        >>> snap.lookup('host.domain.tld', TYPE_HOSTRECORD)
+    """
+    def __init__(self, path):
+        """
+        :Parameters:
+            - `path` : string
+        """
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(
+            self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, index_offset = _HEADER.unpack_from(
+            self._map, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise Exception('Unsupported snapshot file %s' % path)
+        self._count = count
+        self._index_offset = index_offset
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return self._count
+
+    def _offset(self, position):
+        return _OFFSET.unpack_from(
+            self._map, self._index_offset + position * _OFFSET.size)[0]
+
+    def _key(self, offset):
+        entity_id, fqdn_len, type_len, name_len, prop_len = \
+            _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size
+        return (self._map[start:start + fqdn_len],
+                self._map[start + fqdn_len:start + fqdn_len + type_len])
+
+    def _record(self, offset):
+        entity_id, fqdn_len, type_len, name_len, prop_len = \
+            _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size + fqdn_len
+        entity_type = self._map[start:start + type_len]
+        start += type_len
+        name = self._map[start:start + name_len]
+        start += name_len
+        properties = self._map[start:start + prop_len]
+        return APIObject(EntityDict=dict(
+            id=entity_id,
+            name=name,
+            type=entity_type,
+            properties=properties or None))
+
+    def lookup(self, fqdn, rec_type=None):
+        """
+        Find entities by absolute name
+
+        :Parameters:
+            - `fqdn` : string [ i.e. 'host.subzone.domain.tld' ]
+            - `rec_type` : string [ optional, one of the TYPE_* constants ]
+
+        :return:
+            list of entities, see :py:class:`proteus.objects.apientity.APIObject`
+        """
+        fqdn = _encode(fqdn).lower().rstrip('.')
+        key = (fqdn, _encode(rec_type))
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(self._offset(middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        result = []
+        while low < self._count:
+            offset = self._offset(low)
+            found_fqdn, found_type = self._key(offset)
+            if found_fqdn != fqdn \
+                or (rec_type is not None and found_type != key[1]):
+                break
+            result.append(self._record(offset))
+            low += 1
+        return result
+
+    def __iter__(self):
+        for position in xrange(self._count):
+            yield self._record(self._offset(position))
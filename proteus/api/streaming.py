@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Streamed SOAP replies
+
+suds reads the whole HTTP body and builds the whole reply tree before
+returning. Here suds only builds the request, the reply is handed to the
+caller as an open file-like object, so it can be parsed while it arrives,
+i.e. by :py:func:`proteus.api.fastxml.iter_entities`.
+"""
+
+import sys
+import urllib2
+
+try:
+    from suds.transport import Request, TransportError
+except ImportError, e:
+    print "You don't have the python suds library installed."
+    sys.exit(1)
+
+
+class CountingReader(object):
+    """
+    File-like wrapper counting the bytes read
+    """
+    def __init__(self, fp):
+        self._fp = fp
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        self.size += len(data)
+        return data
+
+    def close(self):
+        self._fp.close()
+
+
+def _build_request(client, operation, *args):
+    """
+    Let suds marshal a call without sending it
+
+    :return:
+        tuple of ( :py:class:`suds.transport.Request`, suds RequestContext )
+    """
+    client.set_options(nosend=True)
+    try:
+        context = getattr(client.service, operation)(*args)
+    finally:
+        client.set_options(nosend=False)
+    soap_client = context.client
+    request = Request(soap_client.location(), context.envelope)
+    request.headers = soap_client.headers()
+    return request, context
+
+
+def open_stream(client, operation, *args):
+    """
+    Send a SOAP call and return the unread reply
+
+    The request goes through the transport of the suds Client, so the
+    session cookie of the Client is sent and updated. The client must not
+    be used for other calls until the reply is closed.
+
+    :Parameters:
+        - `client` : suds Client
+        - `operation` : string [ SOAP operation ]
+
+    :return:
+        :py:class:`CountingReader` with the reply body
+
+    :raise:
+        suds.WebFault for SOAP faults
+    """
+    request, context = _build_request(client, operation, *args)
+    transport = client.options.transport
+    if hasattr(transport, 'open_stream'):
+        # i.e. proteus.api.transport.KeepAliveTransport
+        try:
+            return CountingReader(transport.open_stream(request))
+        except TransportError, e:
+            context.process_reply(e.fp.read(), e.httpcode, str(e))
+            raise
+    u2request = urllib2.Request(request.url, request.message, request.headers)
+    transport.addcookies(u2request)
+    transport.proxy = transport.options.proxy
+    try:
+        fp = transport.u2open(u2request)
+    except urllib2.HTTPError, e:
+        # faults are reported with status 500, let suds raise them
+        context.process_reply(e.fp.read(), e.code, e.msg)
+        raise
+    transport.getcookies(fp, u2request)
+    return CountingReader(fp)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+import os
+import json
+import hashlib
+import tempfile
+
+from constants import *
+from proteus.objects import *
+
+
+def _fingerprint(entity):
+    """
+    Content hash of a raw APIEntity
+    """
+    content = u'%s\0%s\0%s' % (
+        getattr(entity, 'name', None) or u'',
+        getattr(entity, 'type', None) or u'',
+        getattr(entity, 'properties', None) or u'')
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+class SyncResult(object):
+    """
+    Differences found by :py:meth:`ZoneSync.sync`
+    """
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.removed = []
+
+    def has_changes(self):
+        return len(self.added) > 0 \
+            or len(self.changed) > 0 \
+            or len(self.removed) > 0
+
+    def __repr__(self):
+        a = super(SyncResult, self).__repr__()
+        return '%s | added: %d changed: %d removed: %d' % (
+            a, len(self.added), len(self.changed), len(self.removed))
+
+
+class ZoneSync(object):
+    """
+    Incremental zone synchronisation
+
+    Keeps a content fingerprint per entity id, per zone and record type,
+    from the previous run. A sync pages through getEntities and only
+    decodes entities whose fingerprint is new or differs, so the work
+    done for unchanged records is a hash comparison. Proteus has no
+    "changed since" query, the entity listings themselves are still
+    transferred in full.
+    """
+    def __init__(self, dns, state_path=None, page_size=DEFAULT_PAGE_SIZE):
+        """
+        :Parameters:
+            - `dns` : :py:class:`proteus.api.dns.DNS`
+            - `state_path` : string [ optional, file the fingerprints are persisted in ]
+            - `page_size` : int
+
+        Example:
+            >>> from proteus.api.sync import ZoneSync
+            >>> sync=ZoneSync(pc.DNS, '/var/lib/proteus/sync.json')
+            >>> result=sync.sync('domain.tld', view_name='Internal')
+            >>> for record in result.added + result.changed:
+            ...     print record.name
+        """
+        self._dns = dns
+        self._state_path = state_path
+        self._page_size = page_size
+        self._state = {}
+        if state_path is not None and os.path.exists(state_path):
+            f = open(state_path, 'rb')
+            try:
+                self._state = json.load(f)
+            finally:
+                f.close()
+
+    def save(self):
+        """
+        Write the fingerprints to `state_path`
+        """
+        if self._state_path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self._state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        f = os.fdopen(fd, 'wb')
+        try:
+            json.dump(self._state, f)
+        finally:
+            f.close()
+        os.rename(tmp_path, self._state_path)
+
+    def reset(self, zonename=None, view=None):
+        """
+        Forget the fingerprints of one zone or of everything
+        """
+        if zonename is None:
+            self._state = {}
+        else:
+            self._state.pop(self._zone_key(zonename, view), None)
+
+    def _zone_key(self, zonename, view):
+        return '%s:%s' % (view.id, zonename.lower())
+
+    def sync(self, zonename, view=None, view_name=None,
+             record_types=DNS_ALLTYPES):
+        """
+        Compare a zone with the previous run
+
+        :Parameters:
+            - `zonename` : string [ i.e. 'subzone.domain.tld' ]
+            - `view` : :py:class:`proteus.objects.apientity.View`
+            - `view_name` : string
+            - `record_types` : list of record types
+
+        :return:
+            :py:class:`SyncResult`, removed entities are reported by id
+        """
+        dns = self._dns
+        if view is None and view_name is not None:
+            view = dns.get_view(view_name)
+        if view is None:
+            raise Exception('Unknown view')
+        zone = dns._find_zone(zonename, view)
+        if zone is None:
+            raise Exception('Unknown zone %s' % zonename)
+        client = dns._client
+        zone_key = self._zone_key(zonename, view)
+        zone_state = dict(self._state.get(zone_key, {}))
+        result = SyncResult()
+        for record_type in record_types:
+            previous = zone_state.get(record_type, {})
+            current = {}
+            for item in client._iter_entities(
+                    zone.id, record_type, self._page_size, strict=True):
+                entity_id = str(item.id)
+                fingerprint = _fingerprint(item)
+                current[entity_id] = fingerprint
+                old = previous.get(entity_id)
+                if old == fingerprint:
+                    continue
+                record = APIObject(TypeRecord=item, client=client)
+                if record is None:
+                    continue
+                if old is None:
+                    result.added.append(record)
+                else:
+                    result.changed.append(record)
+            for entity_id in previous:
+                if entity_id not in current:
+                    result.removed.append(long(entity_id))
+            zone_state[record_type] = current
+        # only commit the new fingerprints once every type was listed
+        self._state[zone_key] = zone_state
+        self.save()
+        return result
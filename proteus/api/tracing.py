@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+""" Nested trace spans for high level operations and their SOAP calls """
+
+import json
+import time
+import functools
+import threading
+
+from contextlib import contextmanager
+
+from instrumentation import Instrument, summarize_arguments
+
+
+KIND_OPERATION = 'operation'
+KIND_SOAP = 'soap'
+
+
+class Span(object):
+    """
+    A timed operation with its nested child spans
+
+    :Attributes:
+        - `name` : string [ method or SOAP operation name ]
+        - `kind` : string [ 'operation' or 'soap' ]
+        - `attributes` : dict
+        - `children` : list of :py:class:`Span`, in start order
+        - `started` : float [ unix timestamp ]
+        - `finished` : float [ unix timestamp, None while running ]
+        - `error` : string [ None if the span succeeded ]
+    """
+    __slots__ = ('name', 'kind', 'parent', 'attributes', 'children',
+                 'started', 'finished', 'error')
+
+    def __init__(self, name, kind=KIND_OPERATION, parent=None,
+                 attributes=None):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.attributes = attributes or {}
+        self.children = []
+        self.started = time.time()
+        self.finished = None
+        self.error = None
+
+    def _get_duration(self):
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+    duration = property(_get_duration, doc='Duration in seconds')
+
+    def round_trips(self):
+        """
+        Count the SOAP calls issued by this span and its descendants
+        """
+        count = 0
+        if self.kind == KIND_SOAP:
+            count = 1
+        for child in self.children:
+            count += child.round_trips()
+        return count
+
+    def critical_path(self):
+        """
+        Follow the child finishing last on every level
+
+        :return:
+            list of :py:class:`Span`, starting with this span
+        """
+        path = [self]
+        span = self
+        while len(span.children) > 0:
+            span = max(span.children, key=lambda c: c.finished or 0)
+            path.append(span)
+        return path
+
+    def to_dict(self):
+        return dict(
+            name=self.name,
+            kind=self.kind,
+            started=self.started,
+            duration=self.duration,
+            attributes=self.attributes,
+            error=self.error,
+            round_trips=self.round_trips(),
+            children=[child.to_dict() for child in self.children])
+
+
+class FileExporter(object):
+    """
+    Append every finished trace as one JSON line to a file
+    """
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        line = json.dumps(span.to_dict(), default=repr)
+        with self._lock:
+            f = open(self._path, 'a')
+            try:
+                f.write(line + '\n')
+            finally:
+                f.close()
+
+
+class Tracer(Instrument):
+    """
+    Records nested spans per thread and hands every finished root span to
+    the exporter
+
+    The tracer is an :py:class:`proteus.api.instrumentation.Instrument`, so
+    adding it to a client turns every SOAP call into a span, nested below
+    the traced :py:class:`proteus.api.dns.DNS` method issuing it.
+
+    Example:
+        >>> from proteus.api.tracing import Tracer, FileExporter
+        >>> pc=ProteusClient(..., instruments=[Tracer(FileExporter('/tmp/trace.json'))])
+        >>> traces=[]
+        >>> pc.add_instrument(Tracer(traces.append))
+        >>> pc.DNS.get_mx_record('host', 'domain.tld', view_name='Internal')
+        >>> traces[-1].round_trips()
+    """
+    def __init__(self, exporter=None):
+        """
+        :Parameters:
+            - `exporter` : callable [ called with every finished root :py:class:`Span` ]
+        """
+        self._exporter = exporter
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    def current(self):
+        """
+        Get the innermost running span of the calling thread
+        """
+        stack = self._stack()
+        if len(stack) > 0:
+            return stack[-1]
+        return None
+
+    def start(self, name, kind=KIND_OPERATION, attributes=None):
+        stack = self._stack()
+        parent = None
+        if len(stack) > 0:
+            parent = stack[-1]
+        span = Span(name, kind, parent, attributes)
+        if parent is not None:
+            parent.children.append(span)
+        stack.append(span)
+        return span
+
+    def finish(self, span, error=None):
+        span.finished = time.time()
+        if error is not None:
+            span.error = repr(error)
+        stack = self._stack()
+        if len(stack) > 0 and stack[-1] is span:
+            stack.pop()
+        if span.parent is None and self._exporter is not None:
+            self._exporter(span)
+
+    @contextmanager
+    def span(self, name, kind=KIND_OPERATION, attributes=None):
+        """
+        Context manager running the block as a span
+        """
+        span = self.start(name, kind, attributes)
+        error = None
+        try:
+            yield span
+        except BaseException, e:
+            # also GeneratorExit and KeyboardInterrupt, which would
+            # leave the span on the stack otherwise
+            error = e
+            raise
+        finally:
+            self.finish(span, error)
+
+    @contextmanager
+    def attached(self, parent):
+        """
+        Context manager nesting the spans of the calling thread below a span
+        of another thread
+        """
+        if parent is None:
+            yield
+            return
+        stack = self._stack()
+        stack.append(parent)
+        try:
+            yield
+        finally:
+            stack.remove(parent)
+
+    def wrap(self, func):
+        """
+        Bind func to the current span, for calling it in a worker thread
+        """
+        parent = self.current()
+
+        def _attached(*args, **kwargs):
+            with self.attached(parent):
+                return func(*args, **kwargs)
+        return _attached
+
+    def before_call(self, operation, arguments):
+        self.start(operation, KIND_SOAP, dict(arguments=arguments))
+
+    def after_call(self, record):
+        span = self.current()
+        if span is None or span.kind != KIND_SOAP:
+            return
+        if record.size is not None:
+            span.attributes['size'] = record.size
+        if record.count is not None:
+            span.attributes['count'] = record.count
+        self.finish(span, record.error)
+
+
+def find_tracer(client):
+    """
+    Get the :py:class:`Tracer` among the instruments of a client
+    """
+    for instrument in getattr(client, '_instruments', ()):
+        if isinstance(instrument, Tracer):
+            return instrument
+    return None
+
+
+def traced(method):
+    """
+    Decorator running a method of a class holding the client in `_client`
+    as a span, when the client has a :py:class:`Tracer`
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def _traced(self, *args, **kwargs):
+        tracer = find_tracer(self._client)
+        if tracer is None:
+            return method(self, *args, **kwargs)
+        attributes = dict(arguments=summarize_arguments(args))
+        for key, value in kwargs.items():
+            attributes[key] = repr(value)
+        with tracer.span(name, KIND_OPERATION, attributes):
+            return method(self, *args, **kwargs)
+    return _traced
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# python-proteus - Proteus IPAM Python Library
+# Copyright (C) 2012 Stephan Adig <sh@sourcecode.de>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+###############################################################################
+
+"""
+Persistent HTTP transport for suds
+
+The default suds transport goes through urllib2, which opens a new TCP
+(and TLS) connection for every call and never asks for compressed replies.
+"""
+
+import sys
+import zlib
+import select
+import socket
+import httplib
+import urllib2
+import urlparse
+import cookielib
+
+from copy import deepcopy
+from cStringIO import StringIO
+
+try:
+    from suds.properties import Unskin
+    from suds.transport import Transport, TransportError, Reply
+except ImportError, e:
+    print "You don't have the python suds library installed."
+    sys.exit(1)
+
+
+READ_SIZE = 16384
+# idle persistent connections kept per transport
+MAX_IDLE = 2
+
+
+def _is_dropped(connection):
+    """
+    Check whether an idle connection was closed by the server
+
+    An idle connection has nothing to read, unless the server closed it.
+    """
+    if connection.sock is None:
+        return True
+    try:
+        return len(select.select([connection.sock], [], [], 0)[0]) > 0
+    except (select.error, socket.error, ValueError):
+        return True
+
+
+def _setup_socket(sock, read_timeout):
+    sock.settimeout(read_timeout)
+    # requests are small and answered right away, don't let Nagle's
+    # algorithm hold them back waiting for delayed ACKs
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class _HTTPConnection(httplib.HTTPConnection):
+    """
+    HTTPConnection with separate connect and read timeouts
+    """
+    def __init__(self, host, port=None, connect_timeout=None,
+                 read_timeout=None):
+        httplib.HTTPConnection.__init__(
+            self, host, port, timeout=connect_timeout)
+        self.read_timeout = read_timeout
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        _setup_socket(self.sock, self.read_timeout)
+
+
+class _HTTPSConnection(httplib.HTTPSConnection):
+    """
+    HTTPSConnection with separate connect and read timeouts
+    """
+    def __init__(self, host, port=None, connect_timeout=None,
+                 read_timeout=None):
+        httplib.HTTPSConnection.__init__(
+            self, host, port, timeout=connect_timeout)
+        self.read_timeout = read_timeout
+
+    def connect(self):
+        httplib.HTTPSConnection.connect(self)
+        _setup_socket(self.sock, self.read_timeout)
+
+
+class _CookieResponse(object):
+    """
+    Adapter giving cookielib the headers of an httplib response
+    """
+    def __init__(self, response):
+        self._response = response
+
+    def info(self):
+        return self._response.msg
+
+
+class _Decoder(object):
+    """
+    File-like reader decompressing a response body while it is read
+    """
+    def __init__(self, response, encoding, release):
+        self._response = response
+        self._release = release
+        self._decompressor = None
+        if encoding == 'gzip':
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        self._buffer = ''
+        self._done = False
+        self.headers = {}
+
+    def _fill(self, size):
+        while not self._done and (size < 0 or len(self._buffer) < size):
+            chunk = self._response.read(READ_SIZE)
+            if not chunk:
+                self._done = True
+                if self._decompressor is not None:
+                    self._buffer += self._decompressor.flush()
+                break
+            if self._decompressor is not None:
+                chunk = self._decompressor.decompress(chunk)
+            self._buffer += chunk
+
+    def read(self, size=-1):
+        self._fill(size)
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        """
+        Give the connection back, it can only be reused when the whole
+        response was read
+        """
+        if self._release is not None:
+            self._release(self._done)
+            self._release = None
+
+
+class KeepAliveTransport(Transport):
+    """
+    suds transport keeping persistent HTTP/1.1 connections
+
+    Replies are requested gzip or deflate compressed, requests can be sent
+    gzip compressed as well. A connection the server closed while it was
+    idle is reopened transparently. While a reply of
+    :py:meth:`open_stream` is still being read its connection is busy,
+    other calls go over a second connection. Every suds Client has its own
+    copy of the transport, also the clones of pooled sessions, so a
+    connection is never used by two threads at once. Proxies aren't
+    supported.
+
+    Example:
+        >>> from proteus.api.transport import KeepAliveTransport
+        >>> pc=ProteusClient(..., transport=KeepAliveTransport(read_timeout=30))
+    """
+    def __init__(self, connect_timeout=10, read_timeout=None, compress=True,
+                 compress_requests=False):
+        """
+        :Parameters:
+            - `connect_timeout` : float [ seconds ]
+            - `read_timeout` : float [ seconds, None uses the suds timeout option ]
+            - `compress` : bool [ ask for gzip or deflate compressed replies ]
+            - `compress_requests` : bool [ send gzip compressed requests, the server has to support it ]
+        """
+        Transport.__init__(self)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.compress = compress
+        self.compress_requests = compress_requests
+        self.cookiejar = cookielib.CookieJar()
+        # (address, connection) of the connections without a pending
+        # response, the most recently used last
+        self._idle = []
+
+    def __deepcopy__(self, memo={}):
+        clone = self.__class__(
+            self.connect_timeout,
+            self.read_timeout,
+            self.compress,
+            self.compress_requests)
+        # the suds transport options, i.e. timeout, are set on the
+        # transport and not relinked by Client.clone
+        Unskin(clone.options).update(
+            deepcopy(Unskin(self.options).defined, memo))
+        return clone
+
+    def _get_connection(self, address):
+        """
+        Take an idle connection to `address` or open a new one
+
+        :return:
+            tuple of ( connection, bool [ reused ] )
+        """
+        for i in reversed(range(len(self._idle))):
+            if self._idle[i][0] == address:
+                connection = self._idle.pop(i)[1]
+                if not _is_dropped(connection):
+                    return connection, True
+                connection.close()
+        scheme, netloc = address
+        read_timeout = self.read_timeout
+        if read_timeout is None:
+            read_timeout = self.options.timeout
+        if scheme == 'https':
+            connection = _HTTPSConnection(
+                netloc, connect_timeout=self.connect_timeout,
+                read_timeout=read_timeout)
+        else:
+            connection = _HTTPConnection(
+                netloc, connect_timeout=self.connect_timeout,
+                read_timeout=read_timeout)
+        return connection, False
+
+    def _release(self, address, connection, complete):
+        """
+        Keep a connection for reuse, an unread response blocks it
+        """
+        if not complete:
+            connection.close()
+            return
+        self._idle.append((address, connection))
+        while len(self._idle) > MAX_IDLE:
+            self._idle.pop(0)[1].close()
+
+    def close(self):
+        """
+        Close the idle connections, busy ones are closed once their reply
+        is read
+        """
+        idle = self._idle
+        self._idle = []
+        for address, connection in idle:
+            connection.close()
+
+    def _request(self, method, url, body=None, headers=None):
+        """
+        Send a request and return the response with its headers read
+
+        A reused connection may have been closed by the server in the
+        meantime. When sending the request on it fails, it is sent once
+        more on another connection. Once the request went out it isn't
+        repeated, the server may have carried it out already.
+
+        :return:
+            tuple of ( address, connection, httplib.HTTPResponse )
+        """
+        parts = urlparse.urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+        headers = dict(headers or {})
+        u2request = urllib2.Request(url, body, headers)
+        self.cookiejar.add_cookie_header(u2request)
+        headers.update(u2request.unredirected_hdrs)
+        if self.compress:
+            headers['Accept-Encoding'] = 'gzip, deflate'
+        if body is not None and self.compress_requests:
+            compressor = zlib.compressobj(
+                6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            body = compressor.compress(body) + compressor.flush()
+            headers['Content-Encoding'] = 'gzip'
+        address = (parts.scheme, parts.netloc)
+        while True:
+            connection, reused = self._get_connection(address)
+            try:
+                connection.request(method, path, body, headers)
+                break
+            except (httplib.CannotSendRequest, socket.error), e:
+                connection.close()
+                if not reused or isinstance(e, socket.timeout):
+                    raise
+        try:
+            response = connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+        self.cookiejar.extract_cookies(_CookieResponse(response), u2request)
+        return address, connection, response
+
+    def _open_response(self, method, url, body=None, headers=None):
+        address, connection, response = self._request(
+            method, url, body, headers)
+        encoding = (response.getheader('content-encoding') or '').lower()
+
+        def _release(complete):
+            self._release(address, connection, complete)
+        reader = _Decoder(response, encoding, _release)
+        reader.headers = dict(response.getheaders())
+        if response.status >= 300:
+            content = reader.read()
+            reader.close()
+            raise TransportError(
+                response.reason, response.status, StringIO(content))
+        return reader
+
+    def open(self, request):
+        """
+        GET the url of the request, i.e. the WSDL
+        """
+        if urlparse.urlsplit(request.url).scheme not in ('http', 'https'):
+            # i.e. file:// urls of a WSDLCache
+            return urllib2.urlopen(request.url)
+        reader = self._open_response('GET', request.url, None, request.headers)
+        try:
+            return StringIO(reader.read())
+        finally:
+            reader.close()
+
+    def send(self, request):
+        """
+        POST a SOAP request
+        """
+        reader = self._open_response(
+            'POST', request.url, request.message, request.headers)
+        try:
+            return Reply(httplib.OK, reader.headers, reader.read())
+        finally:
+            reader.close()
+
+    def open_stream(self, request):
+        """
+        POST a SOAP request and return the unread, decompressing reply,
+        see :py:func:`proteus.api.streaming.open_stream`
+        """
+        return self._open_response(
+            'POST', request.url, request.message, request.headers)
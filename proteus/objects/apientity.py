@@ -26,41 +26,58 @@ except ImportError, e:
     sys.exit(1)
 
 
+_TYPE_REGISTRY = {}
+
+
+def register_type(type_name, entity_class):
+    """
+    Map a Proteus type string to the class :py:class:`APIObject` creates
+    for entities of that type, matching is case insensitive
+
+    :Parameters:
+        - `type_name` : string [ i.e. one of the TYPE_* constants from :py:mod:`proteus.api.constants` ]
+        - `entity_class` : subclass of :py:class:`ProteusDataObjects`
+
+    Example:
+        >>> from proteus.objects import register_type
+        >>> class IP4Network(ProteusDataObjects):
+        ...     __slots__ = ()
+        >>> register_type('IP4Network', IP4Network)
+    """
+    _TYPE_REGISTRY[type_name] = entity_class
+    _TYPE_REGISTRY[type_name.lower()] = entity_class
+
+
 class APIObject(object):
     """
     Factory for creating the correct APIEntity Python Objects
+
+    Accepts either a suds APIEntity as `TypeRecord` or an already decoded
+    dict with the keys id, name, type and properties as `EntityDict`.
+    A `TypeRecord` which already is a dict, i.e. from the fast decode path
+    of :py:mod:`proteus.api.fastxml`, is used as it is.
     """
     def __new__(cls, *args, **kwargs):
-        _apientity = None
+        _apientity_dict = None
         obj_type = None
         if 'TypeRecord' in kwargs:
-            _apientity = kwargs.get('TypeRecord', None)
-            _apientity_dict = asdict(_apientity)
-            if len(_apientity_dict) == 0:
-                return None
-            obj_type = _apientity_dict.get('type', None)
-            del kwargs['TypeRecord']
-        kwargs['data'] = _apientity
+            _apientity = kwargs.pop('TypeRecord')
+            if isinstance(_apientity, dict):
+                _apientity_dict = _apientity
+            else:
+                _apientity_dict = asdict(_apientity)
+        elif 'EntityDict' in kwargs:
+            _apientity_dict = kwargs.pop('EntityDict')
+        if not _apientity_dict:
+            return None
+        obj_type = _apientity_dict.get('type', None)
         kwargs['data_dict'] = _apientity_dict
         if obj_type is not None:
-            if obj_type.lower() == 'zone':
-                return Zone(*args, **kwargs)
-            if obj_type.lower() == 'configuration':
-                return Configuration(*args, **kwargs)
-            if obj_type.lower() == 'view':
-                return View(*args, **kwargs)
-            if obj_type.lower() == 'hostrecord':
-                return HostRecord(*args, **kwargs)
-            if obj_type.lower() == 'mxrecord':
-                return MXRecord(*args, **kwargs)
-            if obj_type.lower() == 'txtrecord':
-                return TXTRecord(*args, **kwargs)
-            if obj_type.lower() == 'aliasrecord':
-                return CNAMERecord(*args, **kwargs)
-            if obj_type.lower() == 'hinforecord':
-                return HINFORecord(*args, **kwargs)
-            if obj_type.lower() == 'srvrecord':
-                return SRVRecord(*args, **kwargs)
+            entity_class = _TYPE_REGISTRY.get(obj_type)
+            if entity_class is None:
+                entity_class = _TYPE_REGISTRY.get(obj_type.lower())
+            if entity_class is not None:
+                return entity_class(*args, **kwargs)
 
         return None
 
@@ -68,23 +85,65 @@ class APIObject(object):
         print self.__class__.__name__
 
 
+def _plain(value):
+    """
+    Convert suds Text values into plain strings, they carry extra slots
+    """
+    if isinstance(value, unicode):
+        try:
+            return str(value)
+        except UnicodeEncodeError:
+            return unicode(value)
+    return value
+
+
 class ProteusPropertyObject(object):
+    """
+    Properties of an APIEntity, parsed from the `key=value|...` string
+
+    Every property is accessible as attribute. The string is only parsed
+    on the first attribute access, records whose properties are never read
+    don't pay for it.
+    """
+    __slots__ = ('_property_string', '_properties')
+
     def __init__(self, properties=None):
         self._property_string = None
+        self._properties = None
         if properties is not None:
-            self._property_string = properties
-        self._parse_properties()
+            self._property_string = _plain(properties)
 
     def _parse_properties(self):
+        """
+        Parse the property string in a single pass, values may contain '='
+        """
+        properties = {}
+        if self._property_string is not None:
+            for i in self._property_string.split('|'):
+                key, sep, value = i.partition('=')
+                if sep:
+                    properties[key] = value
+        self._properties = properties
+        return properties
+
+    def _get_property_list(self):
         if self._property_string is None:
-            return None
-        property_list = self._property_string[:-1].split('|')
-        self.__dict__['_property_list'] = []
-        for i in property_list:
-            arr = iter(i.split('='))
-            dc = dict(zip(arr, arr))
-            self.__dict__['_property_list'].append(i.split('=')[0])
-            self.__dict__.update(dc)
+            return []
+        return [i.partition('=')[0]
+                for i in self._property_string.split('|') if i]
+    _property_list = property(_get_property_list)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            # i.e. unset slots or __setstate__ looked up while unpickling
+            raise AttributeError(name)
+        properties = self._properties
+        if properties is None:
+            properties = self._parse_properties()
+        try:
+            return properties[name]
+        except KeyError:
+            raise AttributeError(name)
 
     def __repr__(self):
         a = super(ProteusPropertyObject, self).__repr__()
@@ -92,29 +151,29 @@ class ProteusPropertyObject(object):
 
 
 class ProteusDataObjects(object):
-    def __init__(self, *args, **kwargs):
-        self._raw_data = None
-        self._raw_entity = None
-        self._client = None
-        if 'client' in kwargs:
-            self._client = kwargs.get('client', None)
-        if 'data' in kwargs:
-            self._raw_entity = kwargs.get('data', None)
-        if 'data_dict' in kwargs:
-            self._raw_data = kwargs.get('data_dict', None)
-        if self._raw_data is not None:
-            if 'properties' in self._raw_data:
-                self._raw_data['properties'] = ProteusPropertyObject(
-                    self._raw_data['properties'])
+    """
+    Base class of all APIEntity Python Objects
 
-    def __getattr__(self, name):
-        if name in self.__dict__['_raw_data']:
-            return self._raw_data[name]
-        return super(ProteusDataObjects, self).__getattr__(name)
+    Only id, name, type and the parsed properties are kept, neither the
+    suds object nor its dict representation are retained.
+    """
+    __slots__ = ('id', 'name', 'type', 'properties', '_client')
+
+    def __init__(self, *args, **kwargs):
+        self._client = kwargs.get('client', None)
+        data = kwargs.get('data_dict', None) or {}
+        self.id = data.get('id', None)
+        self.name = _plain(data.get('name', None))
+        self.type = _plain(data.get('type', None))
+        properties = data.get('properties', None)
+        if properties is not None \
+            and not isinstance(properties, ProteusPropertyObject):
+            properties = ProteusPropertyObject(properties)
+        self.properties = properties
 
     def __repr__(self):
         a = super(ProteusDataObjects, self).__repr__()
-        return '%s | Members: %s' % (a, self._raw_data.keys())
+        return '%s | Members: %s' % (a, list(ProteusDataObjects.__slots__[:4]))
 
     def add(self, *args, **kwargs):
         """
@@ -147,18 +206,20 @@ class ProteusDataObjects(object):
 
 
 class Zone(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class Configuration(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class View(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class HostRecord(ProteusDataObjects):
+    __slots__ = ()
+
     def add(self, *args, **kwargs):
         pass
 
@@ -170,28 +231,46 @@ class HostRecord(ProteusDataObjects):
 
 
 class TXTRecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class MXRecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class CNAMERecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class HINFORecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class SRVRecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class SOARecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
 
 
 class DNSOptionsRecord(ProteusDataObjects):
-    pass
+    __slots__ = ()
+
+
+class IP4Block(ProteusDataObjects):
+    __slots__ = ()
+
+
+register_type('Configuration', Configuration)
+register_type('View', View)
+register_type('Zone', Zone)
+register_type('HostRecord', HostRecord)
+register_type('MXRecord', MXRecord)
+register_type('TXTRecord', TXTRecord)
+register_type('AliasRecord', CNAMERecord)
+register_type('HINFORecord', HINFORecord)
+register_type('SRVRecord', SRVRecord)
+register_type('StartOfAuthority', SOARecord)
+register_type('DNSOption', DNSOptionsRecord)
+register_type('IP4Block', IP4Block)